@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Resample a BSHC spherical-harmonic model onto HEALPix grids (NESTED
+ordering) at several nside values. Produces the `.npy` maps used by the
+web demos under public/earthtoposources/.
+"""
+
+import argparse
+import functools
+import math
+import os
+import numpy as np
+import healpy as hp
+import pyshtools as pysh
+from scipy.ndimage import map_coordinates
+
+try:
+    import cupy as cp
+    from cupyx.scipy.ndimage import map_coordinates as cp_map_coordinates
+    HAVE_CUPY = True
+except ImportError:
+    HAVE_CUPY = False
+
+DEFAULT_BSHC = 'public/earthtoposources/sur.bshc'
+DEFAULT_NSIDES = [64, 128, 256]
+
+try:
+    import ducc0
+    HAVE_DUCC0 = True
+except ImportError:
+    HAVE_DUCC0 = False
+
+
+def coeffs_to_alm(coeffs_array):
+    """
+    Repack a (2, lmax+1, lmax+1) real 4pi-normalized coefficient array
+    (no Condon-Shortley phase) into the packed complex triangular layout
+    used by ducc0. ducc0 expects the orthonormal (libsharp/healpy)
+    convention, whose basis functions are 1/sqrt(4pi) of the
+    4pi-normalized ones, so that factor is folded into the repack; the
+    result reproduces the pyshtools synthesis to machine precision.
+    """
+    lmax = coeffs_array.shape[1] - 1
+    l = np.arange(lmax + 1)
+    norm = math.sqrt(4.0 * math.pi)
+    alm = np.empty((lmax + 1) * (lmax + 2) // 2, dtype=np.complex128)
+    for m in range(lmax + 1):
+        idx = m * (2 * lmax + 1 - m) // 2 + l[m:]
+        if m == 0:
+            alm[idx] = norm * coeffs_array[0, :, 0]
+        else:
+            alm[idx] = ((-1.0) ** m * norm / math.sqrt(2.0)) * (
+                coeffs_array[0, m:, m] - 1j * coeffs_array[1, m:, m])
+    return alm
+
+
+def synthesize_dh2_grid(coeffs_array):
+    """
+    Expand the coefficients onto a DH2-spaced grid that includes both
+    pole rows, through the multi-threaded SIMD-vectorized SHT in ducc0
+    when it is installed, and through pyshtools otherwise.
+    """
+    if not HAVE_DUCC0:
+        # extend=1 adds the south-pole row the resampler's pole
+        # reflection pivots on; only the duplicate 360E column is
+        # dropped, so longitude still wraps cleanly.
+        return pysh.expand.MakeGridDH(coeffs_array, sampling=2,
+                                      extend=1)[:, :-1]
+
+    lmax = coeffs_array.shape[1] - 1
+    n = 2 * (lmax + 1)
+    # Clenshaw-Curtis rings sit at theta = pi*i/n including both poles,
+    # which matches pyshtools' extended DH latitudes exactly.
+    grid = ducc0.sht.synthesis_2d(
+        alm=coeffs_to_alm(coeffs_array).reshape(1, -1),
+        lmax=lmax, mmax=lmax, spin=0, geometry='CC',
+        ntheta=n + 1, nphi=2 * n, nthreads=os.cpu_count() or 1)
+    return grid[0]
+
+# Guard rows added above each pole so the cubic kernel never wraps
+# latitude across the poles. Continuing a meridian through a pole lands
+# on the antipodal meridian, so each guard row is the matching interior
+# row rolled by 180 degrees of longitude.
+GRID_POLE_PAD = 3
+
+
+@functools.lru_cache(maxsize=4)
+def _pix_angles(nside):
+    """
+    Pixel-center angles for an nside, cached across calls: a resolution
+    sweep reconverts several truncations onto the same pixel grids, and
+    each pix2ang materializes 12*nside^2 values per component. float32
+    is ample for fractional grid indices and halves the footprint;
+    uint32 covers every pixel index up to nside=8192.
+    """
+    theta, phi = hp.pix2ang(nside, np.arange(hp.nside2npix(nside),
+                                             dtype=np.uint32), nest=True)
+    return theta.astype(np.float32), phi.astype(np.float32)
+
+
+def bshc_to_healpix(grid_data, nside):
+    """
+    Resample a DH2 grid onto a HEALPix map (NESTED) with prefiltered
+    cubic interpolation. The grid is assumed to span both poles starting
+    at the north pole and lon=0, as produced by synthesize_dh2_grid.
+    Runs on the GPU via cupyx.scipy.ndimage when CuPy is available — at
+    large nside the 12*nside^2 texture-style lookups are far faster
+    there — and falls back to the SciPy implementation otherwise.
+    """
+    nlat, nlon = grid_data.shape
+    theta, phi = _pix_angles(nside)
+
+    pad = GRID_POLE_PAD
+    half = nlon // 2
+    grid_padded = np.concatenate([
+        np.roll(grid_data[pad:0:-1], half, axis=1),
+        grid_data,
+        np.roll(grid_data[-2:-pad - 2:-1], half, axis=1),
+    ])
+
+    # Map angles to fractional grid indices (float32 throughout)
+    lat_idx = theta * np.float32((nlat - 1) / np.pi) + np.float32(pad)
+    lon_idx = phi * np.float32(nlon / (2 * np.pi))
+    lon_idx = np.mod(lon_idx, np.float32(nlon))
+
+    if HAVE_CUPY:
+        out = cp_map_coordinates(cp.asarray(grid_padded),
+                                 cp.stack([cp.asarray(lat_idx),
+                                           cp.asarray(lon_idx)]),
+                                 order=3, mode='grid-wrap')
+        return cp.asnumpy(out)
+
+    return map_coordinates(grid_padded, [lat_idx, lon_idx],
+                           order=3, mode='grid-wrap')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Resample a BSHC model onto HEALPix grids')
+    parser.add_argument('--input', default=DEFAULT_BSHC,
+                        help='Input .bshc file')
+    parser.add_argument('--max-lmax', type=int, default=1024,
+                        help='Truncate the expansion at this degree')
+    parser.add_argument('--nsides', type=int, nargs='+',
+                        default=DEFAULT_NSIDES,
+                        help='HEALPix nside values to emit')
+    parser.add_argument('--output-prefix', default='bshc_healpix',
+                        help='Output file prefix')
+    args = parser.parse_args()
+
+    print(f'Loading {args.input}...')
+    coeffs_array, lmax = pysh.shio.read_bshc(args.input)
+    max_lmax = min(args.max_lmax, lmax)
+    coeffs_array = coeffs_array[:, :max_lmax + 1, :max_lmax + 1]
+
+    print(f'Expanding to DH2 grid (lmax={max_lmax})...')
+    grid_data = synthesize_dh2_grid(coeffs_array)
+
+    for nside in args.nsides:
+        print(f'Resampling to nside={nside}...')
+        healpix_map = bshc_to_healpix(grid_data, nside)
+        path = f'{args.output_prefix}{nside}_NESTED.npy'
+        np.save(path, healpix_map)
+        print(f'Saved {path} ({len(healpix_map)} pixels)')
+
+
+if __name__ == '__main__':
+    main()
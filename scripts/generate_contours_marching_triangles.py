@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Extract elevation contour polylines on the sphere via marching triangles.
+
+Evaluates a truncated spherical-harmonic elevation expansion at the
+vertices of a subdivided icosahedron, then walks every triangle to find
+edges crossing each contour level, chains the resulting segments into
+polylines, and exports them as a compact binary file for the web demos.
+"""
+
+import argparse
+import struct
+import numpy as np
+import pyshtools as pysh
+from scipy.interpolate import RectBivariateSpline
+
+DEFAULT_BSHC = 'public/earthtoposources/sur.bshc'
+
+# Elevation contour levels in meters
+CONTOUR_LEVELS = np.concatenate([
+    np.arange(-8000, 0, 500),    # ocean depths
+    np.arange(0, 7000, 500),     # land elevations
+]).astype(np.float64)
+
+MAX_POLYGON_VERTICES = 512
+
+
+def create_icosahedron():
+    """Create the 12 vertices and 20 faces of a unit icosahedron."""
+    phi = (1.0 + np.sqrt(5.0)) / 2.0
+
+    vertices = np.array([
+        [-1, phi, 0], [1, phi, 0], [-1, -phi, 0], [1, -phi, 0],
+        [0, -1, phi], [0, 1, phi], [0, -1, -phi], [0, 1, -phi],
+        [phi, 0, -1], [phi, 0, 1], [-phi, 0, -1], [-phi, 0, 1],
+    ], dtype=np.float32)
+    vertices = vertices / np.linalg.norm(vertices, axis=1, keepdims=True)
+
+    faces = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.uint32)
+
+    return vertices, faces
+
+
+def subdivide_mesh(vertices, faces, levels):
+    """Subdivide the mesh `levels` times, projecting onto the unit sphere."""
+    for _ in range(levels):
+        vertices = list(vertices)
+        midpoint_cache = {}
+
+        def get_midpoint(v1_idx, v2_idx):
+            key = (min(v1_idx, v2_idx), max(v1_idx, v2_idx))
+            if key in midpoint_cache:
+                return midpoint_cache[key]
+            midpoint = (vertices[v1_idx] + vertices[v2_idx]) / 2.0
+            midpoint = midpoint / np.linalg.norm(midpoint)
+            vertices.append(midpoint)
+            idx = len(vertices) - 1
+            midpoint_cache[key] = idx
+            return idx
+
+        new_faces = []
+        for tri in faces.reshape(-1, 3):
+            v1, v2, v3 = int(tri[0]), int(tri[1]), int(tri[2])
+            a = get_midpoint(v1, v2)
+            b = get_midpoint(v2, v3)
+            c = get_midpoint(v3, v1)
+            new_faces.extend([v1, a, c, v2, b, a, v3, c, b, a, b, c])
+
+        vertices = np.array(vertices, dtype=np.float32)
+        faces = np.array(new_faces, dtype=np.uint32).reshape(-1, 3)
+
+    return vertices, faces
+
+
+def evaluate_elevations(vertices, interp):
+    """Sample the interpolated elevation at each mesh vertex."""
+    x = vertices[:, 0]
+    y = vertices[:, 1]
+    z = vertices[:, 2]
+    lat = np.degrees(np.arcsin(np.clip(z, -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(y, x))
+    lon[lon < 0] += 360.0
+
+    return interp.ev(lat, lon)
+
+
+def interpolate_edge(v1, v2, e1, e2, level):
+    """Interpolate the point on an edge where the elevation crosses level."""
+    t = (level - e1) / (e2 - e1)
+    point = v1 + t * (v2 - v1)
+    point = point / np.linalg.norm(point)
+    return point.astype(np.float32)
+
+
+def march_triangles(vertices, faces, elevations, level):
+    """
+    Find all contour segments at the given level. Returns a list of
+    (point_a, point_b) pairs, one per triangle crossed by the contour.
+    """
+    segments = []
+
+    for tri in faces:
+        idx = [int(tri[0]), int(tri[1]), int(tri[2])]
+        elevs = [elevations[i] for i in idx]
+        above = [e >= level for e in elevs]
+
+        if all(above) or not any(above):
+            continue
+
+        crossings = []
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            if above[a] != above[b]:
+                crossings.append(interpolate_edge(
+                    vertices[idx[a]], vertices[idx[b]],
+                    elevs[a], elevs[b], level))
+
+        if len(crossings) == 2:
+            segments.append((crossings[0], crossings[1]))
+
+    return segments
+
+
+def chain_segments(segments, tol=1e-6):
+    """Chain contour segments into polylines by matching endpoints."""
+    polygons = []
+    remaining = list(segments)
+
+    while remaining:
+        seg = remaining.pop()
+        chain = [seg[0], seg[1]]
+
+        extended = True
+        while extended and remaining:
+            extended = False
+            tail = chain[-1]
+            for i, (a, b) in enumerate(remaining):
+                if np.linalg.norm(a - tail) < tol:
+                    chain.append(b)
+                    remaining.pop(i)
+                    extended = True
+                    break
+                if np.linalg.norm(b - tail) < tol:
+                    chain.append(a)
+                    remaining.pop(i)
+                    extended = True
+                    break
+
+        polygons.append(np.array(chain, dtype=np.float32))
+
+    return polygons
+
+
+def downsample_polygon(vertices, max_vertices=MAX_POLYGON_VERTICES):
+    """Downsample a polyline to at most max_vertices points."""
+    if len(vertices) <= max_vertices:
+        return vertices
+    # linspace indices are monotonic by construction, so no dedupe pass
+    return vertices[np.linspace(0, len(vertices) - 1, max_vertices).astype(np.int64)]
+
+
+def export_contour_meshes(path, level_polygons):
+    """
+    Write the contour polylines as a compact binary file.
+
+    Layout: 'CONTUR', number of levels, then per level: the level value,
+    polygon count, and per polygon a vertex count followed by xyz floats.
+    """
+    with open(path, 'wb') as f:
+        f.write(b'CONTUR')
+        f.write(struct.pack('<I', len(level_polygons)))
+        for level, polygons in level_polygons:
+            f.write(struct.pack('<f', level))
+            f.write(struct.pack('<I', len(polygons)))
+            for polygon in polygons:
+                f.write(struct.pack('<I', len(polygon)))
+                # Polygons are contiguous float32 (N, 3) arrays, so their
+                # raw bytes are already the little-endian xyz stream.
+                f.write(np.ascontiguousarray(polygon, dtype=np.float32).tobytes())
+
+    print(f'Saved {path} ({len(level_polygons)} levels)')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract elevation contours via marching triangles')
+    parser.add_argument('--input', default=DEFAULT_BSHC,
+                        help='Input .bshc file')
+    parser.add_argument('--max-lmax', type=int, default=256,
+                        help='Truncate the expansion at this degree')
+    parser.add_argument('--subdivisions', type=int, default=7,
+                        help='Icosphere subdivision level')
+    parser.add_argument('--output', default='contours.bin',
+                        help='Output binary path')
+    args = parser.parse_args()
+
+    print(f'Loading {args.input}...')
+    coeffs_array, lmax = pysh.shio.read_bshc(args.input)
+    coeffs_array = coeffs_array[:, :args.max_lmax + 1, :args.max_lmax + 1]
+    coeffs = pysh.SHCoeffs.from_array(coeffs_array)
+
+    print('Expanding to DH2 grid...')
+    grid = coeffs.expand(grid='DH2', extend=True)
+    lats_flip = grid.lats()[::-1]
+    interp = RectBivariateSpline(lats_flip, grid.lons(), grid.data[::-1],
+                                 kx=3, ky=3)
+
+    print(f'Building icosphere (subdivisions={args.subdivisions})...')
+    base_vertices, base_faces = create_icosahedron()
+    vertices, faces = subdivide_mesh(base_vertices, base_faces,
+                                     args.subdivisions)
+    elevations = evaluate_elevations(vertices, interp)
+
+    level_polygons = []
+    for level in CONTOUR_LEVELS:
+        segments = march_triangles(vertices, faces, elevations, level)
+        polygons = chain_segments(segments)
+        polygons = [downsample_polygon(p) for p in polygons]
+        level_polygons.append((float(level), polygons))
+        print(f'level {level:+8.1f} m: {len(polygons)} polygons')
+
+    export_contour_meshes(args.output, level_polygons)
+
+
+if __name__ == '__main__':
+    main()
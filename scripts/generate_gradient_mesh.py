@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Generate an icosphere mesh carrying elevation plus lat/lon elevation
+gradients, interpolated from a tapered spherical-harmonic expansion of the
+Earth2014 surface model. The binary output is consumed by the web demos'
+mesh loader.
+"""
+
+import argparse
+import math
+import struct
+import numpy as np
+import pyshtools as pysh
+from scipy.ndimage import map_coordinates
+
+DEFAULT_BSHC = 'public/earthtoposources/sur.bshc'
+
+# Guard rows added above each pole so the cubic kernel never wraps
+# latitude across the poles. Continuing a meridian through a pole lands
+# on the antipodal meridian, so each guard row is the matching interior
+# row rolled by 180 degrees of longitude.
+GRID_POLE_PAD = 3
+
+
+def create_icosahedron():
+    """Create the 12 vertices and 20 faces of a unit icosahedron."""
+    phi = (1.0 + np.sqrt(5.0)) / 2.0
+
+    vertices = np.array([
+        [-1, phi, 0], [1, phi, 0], [-1, -phi, 0], [1, -phi, 0],
+        [0, -1, phi], [0, 1, phi], [0, -1, -phi], [0, 1, -phi],
+        [phi, 0, -1], [phi, 0, 1], [-phi, 0, -1], [-phi, 0, 1],
+    ], dtype=np.float64)
+    vertices = vertices / np.linalg.norm(vertices, axis=1, keepdims=True)
+
+    indices = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.uint32)
+
+    return vertices, indices
+
+
+def subdivide_mesh(vertices, indices, levels):
+    """
+    Subdivide the mesh `levels` times, projecting onto the unit sphere.
+
+    Each level is fully vectorized: all unique edges are deduplicated in
+    one np.unique pass and their midpoints created as a single batch.
+    """
+    for _ in range(levels):
+        tris = indices.reshape(-1, 3)
+        n_tris = len(tris)
+
+        edges = np.concatenate([tris[:, [0, 1]], tris[:, [1, 2]],
+                                tris[:, [2, 0]]])
+        # Pack each canonicalized edge into one uint64 so the dedupe is a
+        # plain 1-D np.unique instead of a lexicographic row sort.
+        lo = np.minimum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+        hi = np.maximum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+        packed = (hi << np.uint64(32)) | lo
+        unique_packed, inv = np.unique(packed, return_inverse=True)
+        edge_lo = (unique_packed & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        edge_hi = (unique_packed >> np.uint64(32)).astype(np.int64)
+
+        # Exact output sizes are known up front, so write midpoints and
+        # child triangles straight into preallocated arrays instead of
+        # growing lists or concatenating copies.
+        n_old = len(vertices)
+        n_edges = len(unique_packed)
+        new_vertices = np.empty((n_old + n_edges, 3), dtype=vertices.dtype)
+        new_vertices[:n_old] = vertices
+        midpoints = new_vertices[n_old:]
+        np.add(vertices[edge_lo], vertices[edge_hi], out=midpoints)
+        midpoints *= 0.5
+        midpoints /= np.linalg.norm(midpoints, axis=1, keepdims=True)
+
+        mid_idx = (inv + n_old).astype(np.uint32)
+        a = mid_idx[:n_tris]               # midpoint of (v1, v2)
+        b = mid_idx[n_tris:2 * n_tris]     # midpoint of (v2, v3)
+        c = mid_idx[2 * n_tris:]           # midpoint of (v3, v1)
+        v1, v2, v3 = tris[:, 0], tris[:, 1], tris[:, 2]
+
+        new_indices = np.empty((n_tris, 12), dtype=np.uint32)
+        for col, src in enumerate((v1, a, c, v2, b, a, v3, c, b, a, b, c)):
+            new_indices[:, col] = src
+        indices = new_indices.reshape(-1)
+        vertices = new_vertices
+
+    return vertices, indices
+
+
+def apply_taper(coeffs_array, taper_begin, taper_end):
+    """
+    Apply a cosine taper to coefficient degrees in [taper_begin, taper_end]
+    to suppress ringing from hard truncation.
+    """
+    lmax = coeffs_array.shape[1] - 1
+    l = np.arange(lmax + 1)
+    t = np.clip((l - taper_begin) / max(1, taper_end - taper_begin), 0.0, 1.0)
+    taper = 0.5 * (1.0 + np.cos(np.pi * t))
+    taper[:taper_begin] = 1.0
+    # Broadcasting over the sin m=0 column and upper triangle is harmless:
+    # those entries are zero by construction.
+    coeffs_array *= taper[None, :, None]
+    return coeffs_array
+
+
+def make_interpolator(channels, guard_signs=None):
+    """
+    Build a shared sampler over DH channel grids (spanning both poles)
+    using prefiltered cubic map_coordinates. Longitude wraps
+    periodically — no padded-longitude copy and no spline setup over an
+    enlarged grid — and a few guard rows reflected through each pole
+    (onto the antipodal meridian, hence the 180-degree roll) keep the
+    kernel off the latitude wrap. A channel holding a d/dlat quantity
+    flips sign when the meridian continues through a pole; guard_signs
+    (+1/-1 per channel, default all +1) encodes that parity. Fractional
+    grid indices are computed once per query batch and reused by every
+    channel.
+    """
+    nlat, nlon = channels[0].shape
+    pad = GRID_POLE_PAD
+    half = nlon // 2
+    if guard_signs is None:
+        guard_signs = (1.0,) * len(channels)
+
+    # One preallocated cube holds every padded channel; the guard-row
+    # geometry is computed once and each channel is copied straight into
+    # its slot instead of concatenating three temporaries per channel.
+    cube = np.empty((len(channels), nlat + 2 * pad, nlon),
+                    dtype=np.result_type(*channels))
+    for c, dst, sign in zip(channels, cube, guard_signs):
+        dst[:pad] = sign * np.roll(c[pad:0:-1], half, axis=1)
+        dst[pad:pad + nlat] = c
+        dst[pad + nlat:] = sign * np.roll(c[-2:-pad - 2:-1], half, axis=1)
+
+    def sample(lat, lon):
+        # DH rows run north to south starting at lat=90; with the pole
+        # rows present the last row is exactly lat=-90, so nlat-1 steps
+        # cover 180 degrees.
+        lat_idx = (90.0 - lat) * ((nlat - 1) / 180.0) + pad
+        lat_idx = np.clip(lat_idx, 0.0, nlat + 2 * pad - 1.0)
+        lon_idx = np.mod(lon * (nlon / 360.0), nlon)
+        coords = [lat_idx, lon_idx]
+        out = np.empty((len(cube), len(lat_idx)), dtype=cube.dtype)
+        for k in range(len(cube)):
+            map_coordinates(cube[k], coords, order=3, mode='grid-wrap',
+                            output=out[k])
+        return out.T
+
+    return sample
+
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cart_to_latlon(vertices, lat, lon):
+        # Fuses clip/arcsin/arctan2/degrees/wrap into one pass, avoiding
+        # five full-size temporaries on multi-million vertex meshes.
+        for i in prange(vertices.shape[0]):
+            z = min(1.0, max(-1.0, vertices[i, 2]))
+            lat[i] = math.degrees(math.asin(z))
+            lo = math.degrees(math.atan2(vertices[i, 1], vertices[i, 0]))
+            lon[i] = lo + 360.0 if lo < 0 else lo
+
+
+def vertex_latlon(vertices):
+    """Convert unit-sphere vertices to (lat, lon) in degrees."""
+    if HAVE_NUMBA:
+        lat = np.empty(len(vertices))
+        lon = np.empty(len(vertices))
+        _cart_to_latlon(np.ascontiguousarray(vertices), lat, lon)
+        return lat, lon
+
+    x = vertices[:, 0]
+    y = vertices[:, 1]
+    z = vertices[:, 2]
+    lat = np.degrees(np.arcsin(np.clip(z, -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(y, x))
+    lon[lon < 0] += 360.0
+    return lat, lon
+
+
+def create_grids_with_gradients(coeffs):
+    """
+    Expand the SH coefficients on a DH2 grid, compute the elevation
+    gradient grids, and return bicubic interpolators for elevation,
+    d(elev)/d(lat) and d(elev)/d(lon).
+
+    DH2 rather than DH1: the interpolator samples between grid nodes,
+    and at m = lmax a DH1 grid holds only two longitude samples per
+    cycle, which a cubic kernel cannot reconstruct; DH2's four keep the
+    off-grid error near the taper's own truncation error.
+    """
+    print('Expanding to DH2 grid...')
+    # extend=True adds the south-pole row the interpolator's pole
+    # reflection pivots on; only the duplicate 360E column is dropped,
+    # so longitude still wraps cleanly.
+    grid = coeffs.expand(grid='DH2', extend=True)
+    # The exported channels are float32 anyway; downcasting right after
+    # synthesis halves the grid footprint and the interpolation
+    # bandwidth, and map_coordinates computes in the input dtype.
+    data = grid.data[:, :-1].astype(np.float32)
+
+    print('Computing gradients...')
+    grad = coeffs.gradient(grid='DH2', extend=True)
+
+    # theta is colatitude, so d/dlat = -d/dtheta; convert to per-degree.
+    # Scale the gradient grids in place — at high lmax each copy of these
+    # full-resolution grids costs hundreds of megabytes of peak memory.
+    deg_to_rad = np.pi / 180.0
+    d_lat_data = grad.theta.data
+    np.multiply(d_lat_data, -deg_to_rad, out=d_lat_data)
+    d_lat_data = d_lat_data[:, :-1].astype(np.float32)
+    d_lon_data = grad.phi.data
+    np.multiply(d_lon_data, deg_to_rad, out=d_lon_data)
+    d_lon_data = d_lon_data[:, :-1].astype(np.float32)
+
+    # pyshtools zeroes the gradient grids' pole rows (the components are
+    # direction-dependent exactly at a pole), which would bend near-pole
+    # interpolation toward zero. Their limit along each meridian is a
+    # well-defined m=1 profile; rebuild the rows from one-sided finite
+    # differences of the expansion. The pole gradient is one tangent
+    # vector, so the east profile is the d/dlat profile a quarter turn
+    # ahead in longitude.
+    eps = 1e-4
+    nlon = data.shape[1]
+    lons = np.arange(nlon) * (360.0 / nlon)
+
+    def dlat_limit(pole_lat, lon_deg):
+        sign = 1.0 if pole_lat > 0 else -1.0
+        pole = coeffs.expand(lat=float(pole_lat), lon=0.0)
+        inner = coeffs.expand(lat=np.full(nlon, pole_lat - sign * eps),
+                              lon=lon_deg)
+        return sign * (pole - inner) / eps
+
+    d_lat_data[0] = dlat_limit(90.0, lons)
+    d_lat_data[-1] = dlat_limit(-90.0, lons)
+    d_lon_data[0] = -dlat_limit(90.0, lons + 90.0)
+    d_lon_data[-1] = dlat_limit(-90.0, lons + 90.0)
+
+    print('Building interpolator...')
+    # Continuing a gradient component through a pole flips its sign on
+    # top of the 180-degree roll (for d_lat because the latitude axis
+    # reverses, for d_lon because cos(lat) changes sign); the elevation
+    # carries straight over.
+    return make_interpolator((data, d_lat_data, d_lon_data),
+                             guard_signs=(1.0, -1.0, -1.0))
+
+
+def generate_mesh_with_gradients(subdivisions, interp):
+    """Build the icosphere and sample elevation + gradients at each vertex."""
+    base_vertices, base_indices = create_icosahedron()
+    vertices, indices = subdivide_mesh(base_vertices, base_indices, subdivisions)
+
+    lat, lon = vertex_latlon(vertices)
+
+    print(f'Interpolating at {len(vertices)} vertices...')
+    sampled = interp(lat, lon).astype(np.float32, copy=False)
+    elevation, d_lat, d_lon = sampled.T
+
+    return vertices, indices, elevation, d_lat, d_lon
+
+
+def export_mesh_with_gradients(path, vertices, indices, elevation, d_lat, d_lon):
+    """Write the mesh and per-vertex channels as a compact binary file."""
+    num_vertices = len(vertices)
+    num_indices = len(indices)
+
+    # Stack the three per-vertex channels into one contiguous float32
+    # block and stream arrays with tofile: no intermediate tobytes copies.
+    channels = np.empty((3, num_vertices), dtype=np.float32)
+    channels[0] = elevation
+    channels[1] = d_lat
+    channels[2] = d_lon
+
+    with open(path, 'wb') as f:
+        f.write(b'GRMESH')
+        f.write(struct.pack('<I', num_vertices))
+        f.write(struct.pack('<I', num_indices))
+        vertices.astype(np.float32, copy=False).tofile(f)
+        indices.astype(np.uint32, copy=False).tofile(f)
+        channels.tofile(f)
+
+    print(f'Saved {path} ({num_vertices} vertices)')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate an icosphere mesh with elevation gradients')
+    parser.add_argument('--input', default=DEFAULT_BSHC,
+                        help='Input .bshc file')
+    parser.add_argument('--subdivisions', type=int, default=8,
+                        help='Icosphere subdivision level')
+    parser.add_argument('--taper-begin', type=int, default=1900,
+                        help='Degree at which the cosine taper starts')
+    parser.add_argument('--output', default='gradient_mesh.bin',
+                        help='Output binary mesh path')
+    args = parser.parse_args()
+
+    print(f'Loading {args.input}...')
+    coeffs_array, lmax = pysh.shio.read_bshc(args.input)
+    print(f'lmax={lmax}')
+
+    coeffs_array = apply_taper(coeffs_array, args.taper_begin, lmax)
+    coeffs = pysh.SHCoeffs.from_array(coeffs_array)
+
+    interp = create_grids_with_gradients(coeffs)
+    vertices, indices, elevation, d_lat, d_lon = \
+        generate_mesh_with_gradients(args.subdivisions, interp)
+
+    export_mesh_with_gradients(args.output, vertices, indices,
+                               elevation, d_lat, d_lon)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Build a subdivided icosphere with per-vertex elevation sampled from a
+HEALPix `.npy` map (NESTED ordering) and export it as a compact binary
+mesh for the web demos.
+"""
+
+import argparse
+import struct
+import numpy as np
+import healpy as hp
+
+DEFAULT_MAP = 'public/earthtoposources/etopo2022_surface_min_mean_max_healpix128_NESTED.npy'
+
+
+def create_icosahedron():
+    """Create the 12 vertices and 20 faces of a unit icosahedron."""
+    phi = (1.0 + np.sqrt(5.0)) / 2.0
+
+    vertices = np.array([
+        [-1, phi, 0], [1, phi, 0], [-1, -phi, 0], [1, -phi, 0],
+        [0, -1, phi], [0, 1, phi], [0, -1, -phi], [0, 1, -phi],
+        [phi, 0, -1], [phi, 0, 1], [-phi, 0, -1], [-phi, 0, 1],
+    ], dtype=np.float32)
+    vertices = vertices / np.linalg.norm(vertices, axis=1, keepdims=True)
+
+    indices = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.uint32)
+
+    return vertices, indices
+
+
+def subdivide_mesh(vertices, indices, levels):
+    """Subdivide the mesh `levels` times, projecting onto the unit sphere."""
+    for _ in range(levels):
+        vertices = list(vertices)
+        midpoint_cache = {}
+
+        def get_midpoint(v1_idx, v2_idx):
+            key = (min(v1_idx, v2_idx), max(v1_idx, v2_idx))
+            if key in midpoint_cache:
+                return midpoint_cache[key]
+            midpoint = (vertices[v1_idx] + vertices[v2_idx]) / 2.0
+            midpoint = midpoint / np.linalg.norm(midpoint)
+            vertices.append(midpoint)
+            idx = len(vertices) - 1
+            midpoint_cache[key] = idx
+            return idx
+
+        new_indices = []
+        for tri in indices.reshape(-1, 3):
+            v1, v2, v3 = int(tri[0]), int(tri[1]), int(tri[2])
+            a = get_midpoint(v1, v2)
+            b = get_midpoint(v2, v3)
+            c = get_midpoint(v3, v1)
+            new_indices.extend([v1, a, c, v2, b, a, v3, c, b, a, b, c])
+
+        vertices = np.array(vertices, dtype=np.float32)
+        indices = np.array(new_indices, dtype=np.uint32)
+
+    return vertices, indices
+
+
+def sample_healpix_elevation(vertices, healpix_map):
+    """Sample the mean-elevation channel at each vertex (nearest pixel)."""
+    nside = hp.npix2nside(len(healpix_map))
+    pix = hp.vec2pix(nside, vertices[:, 0], vertices[:, 1], vertices[:, 2],
+                     nest=True)
+    return healpix_map[pix, 1].astype(np.float32)  # channel 1 = mean
+
+
+def export_mesh(path, vertices, indices, elevation):
+    """Write the mesh as a compact binary file for the web loader."""
+    num_vertices = len(vertices)
+    num_indices = len(indices)
+
+    # index_type: 0 = uint16, 1 = uint32
+    if num_vertices <= 0xFFFF:
+        index_type = 0
+        idx_bytes = indices.astype(np.uint16, copy=False).tobytes()
+    else:
+        index_type = 1
+        idx_bytes = indices.astype(np.uint32, copy=False).tobytes()
+
+    header = struct.pack('<6sIIB', b'HPMESH', num_vertices, num_indices,
+                         index_type)
+
+    with open(path, 'wb') as f:
+        f.writelines([
+            header,
+            vertices.astype(np.float32, copy=False).tobytes(),
+            idx_bytes,
+            elevation.astype(np.float32, copy=False).tobytes(),
+        ])
+
+    print(f'Saved {path} ({num_vertices} vertices, {num_indices} indices)')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate an icosphere mesh with HEALPix elevation')
+    parser.add_argument('--input', default=DEFAULT_MAP,
+                        help='Input HEALPix .npy map (NESTED)')
+    parser.add_argument('--subdivisions', type=int, default=7,
+                        help='Icosphere subdivision level')
+    parser.add_argument('--output', default='healpix_mesh.bin',
+                        help='Output binary mesh path')
+    args = parser.parse_args()
+
+    healpix_map = np.load(args.input)
+    print(f'Loaded {args.input}: {len(healpix_map)} pixels')
+
+    base_vertices, base_indices = create_icosahedron()
+    vertices, indices = subdivide_mesh(base_vertices, base_indices,
+                                       args.subdivisions)
+    elevation = sample_healpix_elevation(vertices, healpix_map)
+
+    export_mesh(args.output, vertices, indices, elevation)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Export one elevation icosphere mesh per spherical-harmonic truncation
+level. Each level truncates the Earth2014 expansion at a different lmax
+(with a cosine apodization near the cutoff) so the demos can compare how
+much detail each band limit preserves.
+"""
+
+import argparse
+import math
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyshtools as pysh
+from scipy.ndimage import map_coordinates
+
+try:
+    import ducc0
+    HAVE_DUCC0 = True
+except ImportError:
+    HAVE_DUCC0 = False
+
+DEFAULT_BSHC = 'public/earthtoposources/sur.bshc'
+
+# (lmax, icosphere subdivision level, description)
+TRUNCATION_LEVELS = [
+    (8, 4, 'continents only'),
+    (16, 5, 'coarse relief'),
+    (32, 5, 'major mountain ranges'),
+    (64, 6, 'regional relief'),
+    (128, 6, 'detailed relief'),
+    (256, 7, 'fine relief'),
+    (512, 8, 'full detail'),
+]
+
+
+def create_icosahedron():
+    """Create the 12 vertices and 20 faces of a unit icosahedron."""
+    phi = (1.0 + np.sqrt(5.0)) / 2.0
+
+    vertices = np.array([
+        [-1, phi, 0], [1, phi, 0], [-1, -phi, 0], [1, -phi, 0],
+        [0, -1, phi], [0, 1, phi], [0, -1, -phi], [0, 1, -phi],
+        [phi, 0, -1], [phi, 0, 1], [-phi, 0, -1], [-phi, 0, 1],
+    ], dtype=np.float64)
+    vertices = vertices / np.linalg.norm(vertices, axis=1, keepdims=True)
+
+    indices = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.uint32)
+
+    return vertices, indices
+
+
+def subdivide_mesh(vertices, indices, levels):
+    """
+    Subdivide the mesh `levels` times, projecting onto the unit sphere.
+
+    Each level is fully vectorized: all unique edges are deduplicated in
+    one np.unique pass and their midpoints created as a single batch.
+    """
+    for _ in range(levels):
+        tris = indices.reshape(-1, 3)
+        n_tris = len(tris)
+
+        edges = np.concatenate([tris[:, [0, 1]], tris[:, [1, 2]],
+                                tris[:, [2, 0]]])
+        # Pack each canonicalized edge into one uint64 so the dedupe is a
+        # plain 1-D np.unique instead of a lexicographic row sort.
+        lo = np.minimum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+        hi = np.maximum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+        packed = (hi << np.uint64(32)) | lo
+        unique_packed, inv = np.unique(packed, return_inverse=True)
+        edge_lo = (unique_packed & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        edge_hi = (unique_packed >> np.uint64(32)).astype(np.int64)
+
+        # Exact output sizes are known up front, so write midpoints and
+        # child triangles straight into preallocated arrays instead of
+        # growing lists or concatenating copies.
+        n_old = len(vertices)
+        n_edges = len(unique_packed)
+        new_vertices = np.empty((n_old + n_edges, 3), dtype=vertices.dtype)
+        new_vertices[:n_old] = vertices
+        midpoints = new_vertices[n_old:]
+        np.add(vertices[edge_lo], vertices[edge_hi], out=midpoints)
+        midpoints *= 0.5
+        midpoints /= np.linalg.norm(midpoints, axis=1, keepdims=True)
+
+        mid_idx = (inv + n_old).astype(np.uint32)
+        a = mid_idx[:n_tris]               # midpoint of (v1, v2)
+        b = mid_idx[n_tris:2 * n_tris]     # midpoint of (v2, v3)
+        c = mid_idx[2 * n_tris:]           # midpoint of (v3, v1)
+        v1, v2, v3 = tris[:, 0], tris[:, 1], tris[:, 2]
+
+        new_indices = np.empty((n_tris, 12), dtype=np.uint32)
+        for col, src in enumerate((v1, a, c, v2, b, a, v3, c, b, a, b, c)):
+            new_indices[:, col] = src
+        indices = new_indices.reshape(-1)
+        vertices = new_vertices
+
+    return vertices, indices
+
+
+def generate_mesh_vertices(subdivisions):
+    """Build the subdivided icosphere for a truncation level."""
+    base_vertices, base_indices = create_icosahedron()
+    return subdivide_mesh(base_vertices, base_indices, subdivisions)
+
+
+def truncate_and_apodize(original_array, target_lmax):
+    """
+    Truncate the coefficient array at target_lmax, applying a cosine taper
+    over the top 10% of retained degrees to suppress ringing.
+    """
+    truncated_array = np.zeros((2, target_lmax + 1, target_lmax + 1),
+                               dtype=original_array.dtype)
+
+    L1 = min(target_lmax + 1, original_array.shape[1])
+    L2 = min(target_lmax + 1, original_array.shape[2])
+
+    taper_begin = int(target_lmax * 0.9)
+    l_idx = np.arange(target_lmax + 1)
+    t = np.clip((l_idx - taper_begin) / max(1, target_lmax - taper_begin),
+                0.0, 1.0)
+    taper = np.where(l_idx < taper_begin, 1.0, 0.5 * (1.0 + np.cos(np.pi * t)))
+
+    # Fuse the truncation copy and the taper into one broadcast multiply
+    # writing straight into the output slice, instead of copying the
+    # slice first and rescaling it in a second pass. The sin m=0 column
+    # and upper triangle are zero either way.
+    np.multiply(original_array[:, :L1, :L2], taper[None, :L1, None],
+                out=truncated_array[:, :L1, :L2])
+
+    return truncated_array
+
+
+# Guard rows added above each pole so the cubic kernel never wraps
+# latitude across the poles. Continuing a meridian through a pole lands
+# on the antipodal meridian, so each guard row is the matching interior
+# row rolled by 180 degrees of longitude.
+GRID_POLE_PAD = 3
+
+
+def coeffs_to_alm(coeffs_array):
+    """
+    Repack a (2, lmax+1, lmax+1) real 4pi-normalized coefficient array
+    (no Condon-Shortley phase) into the packed complex triangular layout
+    used by ducc0. ducc0 expects the orthonormal (libsharp/healpy)
+    convention, whose basis functions are 1/sqrt(4pi) of the
+    4pi-normalized ones, so that factor is folded into the repack; the
+    result reproduces the pyshtools synthesis to machine precision.
+    """
+    lmax = coeffs_array.shape[1] - 1
+    l = np.arange(lmax + 1)
+    norm = math.sqrt(4.0 * math.pi)
+    alm = np.empty((lmax + 1) * (lmax + 2) // 2, dtype=np.complex128)
+    for m in range(lmax + 1):
+        idx = m * (2 * lmax + 1 - m) // 2 + l[m:]
+        if m == 0:
+            alm[idx] = norm * coeffs_array[0, :, 0]
+        else:
+            alm[idx] = ((-1.0) ** m * norm / math.sqrt(2.0)) * (
+                coeffs_array[0, m:, m] - 1j * coeffs_array[1, m:, m])
+    return alm
+
+
+def synthesize_dh_grid(coeffs_array):
+    """
+    Expand the coefficients onto a DH2-spaced grid (twice as many
+    longitude columns as latitude rows) that includes both pole rows,
+    through the multi-threaded SIMD-vectorized SHT in ducc0 when it is
+    installed, and through pyshtools otherwise.
+
+    DH1 would be enough for an exact inverse transform, but the sampler
+    interpolates between grid nodes: at m = lmax a DH1 grid holds only
+    two longitude samples per cycle, which a cubic kernel cannot
+    reconstruct, while DH2's four keep the interpolation error around
+    the apodized truncation error itself.
+    """
+    if not HAVE_DUCC0:
+        coeffs = pysh.SHCoeffs.from_array(coeffs_array)
+        # extend=True adds the south-pole row the sampler's pole
+        # reflection pivots on; only the duplicate 360E column is
+        # dropped, so longitude still wraps cleanly.
+        return coeffs.expand(grid='DH2', extend=True).data[:, :-1]
+
+    lmax = coeffs_array.shape[1] - 1
+    n = 2 * (lmax + 1)
+    # Clenshaw-Curtis rings sit at theta = pi*i/n including both poles,
+    # which matches pyshtools' extended DH latitudes exactly.
+    grid = ducc0.sht.synthesis_2d(
+        alm=coeffs_to_alm(coeffs_array).reshape(1, -1),
+        lmax=lmax, mmax=lmax, spin=0, geometry='CC',
+        ntheta=n + 1, nphi=2 * n, nthreads=os.cpu_count() or 1)
+    return grid[0]
+
+
+def create_grid_and_interpolator(coeffs_array):
+    """
+    Expand the truncated coefficients and return a grid sampler.
+
+    Samples the grid with prefiltered cubic map_coordinates instead of
+    constructing a RectBivariateSpline: longitude wraps periodically (no
+    padded-longitude copy, no FITPACK setup over the full grid) and a
+    few guard rows reflected through each pole — onto the antipodal
+    meridian, hence the 180-degree roll — keep the kernel from wrapping
+    latitude across the poles.
+    """
+    data = synthesize_dh_grid(coeffs_array)
+    nlat, nlon = data.shape  # rows span lat = 90..-90 inclusive
+
+    pad = GRID_POLE_PAD
+    half = nlon // 2
+    data_padded = np.concatenate([
+        np.roll(data[pad:0:-1], half, axis=1),
+        data,
+        np.roll(data[-2:-pad - 2:-1], half, axis=1),
+    ])
+
+    def sample(lat, lon):
+        # DH rows run north to south starting at lat=90; with the pole
+        # rows present the last row is exactly lat=-90, so nlat-1 steps
+        # cover 180 degrees.
+        lat_idx = (90.0 - lat) * ((nlat - 1) / 180.0) + pad
+        lat_idx = np.clip(lat_idx, 0.0, len(data_padded) - 1.0)
+        lon_idx = np.mod(lon * (nlon / 360.0), nlon)
+        return map_coordinates(data_padded, [lat_idx, lon_idx],
+                               order=3, mode='grid-wrap')
+
+    return sample
+
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cart_to_latlon(vertices, lat, lon):
+        # Fuses clip/arcsin/arctan2/degrees/wrap into one pass, avoiding
+        # five full-size temporaries on multi-million vertex meshes.
+        for i in prange(vertices.shape[0]):
+            z = min(1.0, max(-1.0, vertices[i, 2]))
+            lat[i] = math.degrees(math.asin(z))
+            lo = math.degrees(math.atan2(vertices[i, 1], vertices[i, 0]))
+            lon[i] = lo + 360.0 if lo < 0 else lo
+
+
+def vertex_latlon(vertices):
+    """Convert unit-sphere vertices to (lat, lon) in degrees."""
+    if HAVE_NUMBA:
+        lat = np.empty(len(vertices))
+        lon = np.empty(len(vertices))
+        _cart_to_latlon(np.ascontiguousarray(vertices), lat, lon)
+        return lat, lon
+
+    x = vertices[:, 0]
+    y = vertices[:, 1]
+    z = vertices[:, 2]
+    lat = np.degrees(np.arcsin(np.clip(z, -1.0, 1.0)))
+    lon = np.degrees(np.arctan2(y, x))
+    lon[lon < 0] += 360.0
+    return lat, lon
+
+
+def evaluate_elevation(lat, lon, interp):
+    """Sample the interpolated elevation at each mesh vertex."""
+    return interp(lat, lon).astype(np.float32)
+
+
+def evaluate_elevation_direct(lat, lon, coeffs_array, chunk=65536):
+    """
+    Evaluate the truncated SH expansion directly at the mesh vertices,
+    skipping the intermediate grid and interpolation entirely. Exact (no
+    grid-interpolation error) and avoids holding the full DH2 grid in
+    memory, but costs O(lmax^2) per point — preferable for small lmax or
+    when fidelity matters more than wall clock.
+    """
+    elevation = np.empty(len(lat), dtype=np.float32)
+    for start in range(0, len(lat), chunk):
+        stop = min(start + chunk, len(lat))
+        elevation[start:stop] = pysh.expand.MakeGridPoint(
+            coeffs_array, lat=lat[start:stop], lon=lon[start:stop])
+    return elevation
+
+
+def export_compact_mesh(path, vertices, indices, elevation):
+    """Write the mesh and elevation channel as a compact binary file."""
+    num_vertices = len(vertices)
+    num_indices = len(indices)
+
+    with open(path, 'wb') as f:
+        f.write(b'TRMESH')
+        f.write(struct.pack('<I', num_vertices))
+        f.write(struct.pack('<I', num_indices))
+        vertices.astype(np.float32, copy=False).tofile(f)
+        indices.astype(np.uint32, copy=False).tofile(f)
+        elevation.astype(np.float32, copy=False).tofile(f)
+
+    print(f'Saved {path} ({num_vertices} vertices)')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export elevation meshes for each SH truncation level')
+    parser.add_argument('--input', default=DEFAULT_BSHC,
+                        help='Input .bshc file')
+    parser.add_argument('--output-dir', default='.',
+                        help='Directory for the output meshes')
+    parser.add_argument('--direct-eval', action='store_true',
+                        help='Evaluate the expansion directly at vertices '
+                             'instead of interpolating a DH2 grid')
+    args = parser.parse_args()
+
+    print(f'Loading {args.input}...')
+    sh_coeffs, lmax = pysh.shio.read_bshc(args.input)
+    print(f'lmax={lmax}')
+
+    # Several truncation levels share a subdivision level; build each
+    # mesh (and its lat/lon angles) only once, before the parallel phase.
+    mesh_cache = {}
+    for _, subdiv, _ in TRUNCATION_LEVELS:
+        if subdiv not in mesh_cache:
+            vertices, indices = generate_mesh_vertices(subdiv)
+            mesh_cache[subdiv] = (vertices, indices, *vertex_latlon(vertices))
+
+    def process_level(level):
+        target_lmax, subdiv, description = level
+        print(f'--- lmax={target_lmax} ({description}) ---')
+        truncated = truncate_and_apodize(sh_coeffs, target_lmax)
+        vertices, indices, lat, lon = mesh_cache[subdiv]
+
+        if args.direct_eval:
+            elevation = evaluate_elevation_direct(lat, lon, truncated)
+        else:
+            interp = create_grid_and_interpolator(truncated)
+            elevation = evaluate_elevation(lat, lon, interp)
+
+        path = f'{args.output_dir}/truncated_lmax{target_lmax}.bin'
+        export_compact_mesh(path, vertices, indices, elevation)
+
+    # The levels are independent, and both the pyshtools synthesis and
+    # the ndimage interpolation release the GIL, so threads overlap the
+    # real work while sharing sh_coeffs and the cached meshes in place.
+    workers = min(len(TRUNCATION_LEVELS), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() propagates any exception raised inside a worker
+        list(pool.map(process_level, TRUNCATION_LEVELS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Render a BSHC spherical-harmonic model to a 2D map projection PNG.
+
+Evaluates the real spherical harmonic expansion directly at every pixel
+of an equirectangular lat/lon grid. Simple and self-contained, but slow
+for large lmax — see render_bshc_pyshtools.py for the fast SHT path.
+"""
+
+import argparse
+import math
+import os
+import numpy as np
+from scipy.ndimage import zoom
+from scipy.special import gammaln
+
+try:
+    import pyshtools as pysh
+    HAVE_PYSHTOOLS = True
+except ImportError:
+    HAVE_PYSHTOOLS = False
+
+try:
+    import cupy as cp
+    HAVE_CUPY = True
+except ImportError:
+    HAVE_CUPY = False
+
+# Degree above which the per-order Legendre loop is worth shipping to
+# the GPU; below this the transfers dominate.
+GPU_MIN_LMAX = 128
+
+if HAVE_CUPY:
+    def _profiles_gpu(cosine_coeffs, sine_coeffs, lmax, cos_theta,
+                      sin_theta):
+        """
+        GPU mirror of the per-order profile loop: the Legendre
+        recurrence runs as elementwise kernels across all latitudes at
+        once and the coefficient contraction accumulates on-device, so
+        only the (lmax+1, n_theta) profiles come back over the bus.
+        """
+        C = cp.asarray(cosine_coeffs[:lmax + 1, :lmax + 1])
+        S = cp.asarray(sine_coeffs[:lmax + 1, :lmax + 1])
+        x = cp.asarray(cos_theta)
+        n = x.size
+        A = cp.empty((lmax + 1, n))
+        B = cp.empty((lmax + 1, n))
+        sqrt2 = math.sqrt(2.0)
+        log_sin = cp.log(cp.asarray(sin_theta))
+
+        for m in range(lmax + 1):
+            log_norm = 0.5 * (math.log(2 * m + 1.0) - math.log(4 * math.pi)
+                              + float(gammaln(2 * m + 1.0))
+                              - 2 * m * math.log(2.0)
+                              - 2 * float(gammaln(m + 1.0)))
+            if m == 0:
+                p_prev = cp.full(n, math.exp(log_norm))
+            else:
+                p_prev = (-1.0) ** m * cp.exp(log_norm + m * log_sin)
+            p_prev2 = cp.zeros(n)
+
+            A[m] = C[m, m] * p_prev
+            B[m] = S[m, m] * p_prev
+            for l in range(m + 1, lmax + 1):
+                if l == m + 1:
+                    p = math.sqrt(2.0 * m + 3.0) * x * p_prev
+                else:
+                    a = math.sqrt((4.0 * l * l - 1.0) / (l * l - m * m))
+                    b = math.sqrt(((l - 1.0) ** 2 - m * m) /
+                                  (4.0 * (l - 1.0) ** 2 - 1.0))
+                    p = a * (x * p_prev - b * p_prev2)
+                p_prev2 = p_prev
+                p_prev = p
+                A[m] += C[l, m] * p
+                B[m] += S[l, m] * p
+            w = 1.0 if m == 0 else sqrt2
+            A[m] *= w
+            B[m] *= w
+
+        return cp.asnumpy(A), cp.asnumpy(B)
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from PIL import Image
+
+
+def load_bshc(filepath, max_lmax=None, use_cache=True):
+    """
+    Load a BSHC (binary spherical harmonic coefficients) file.
+
+    Format: two float64 values (minimum and maximum degree), followed by
+    the cosine coefficients for l=0..lmax, m=0..l, then the sine
+    coefficients in the same triangular order. All little-endian float64.
+
+    When max_lmax is given, only the low-degree prefix of each
+    coefficient block is read — the triangular packing puts low degrees
+    first, so truncating a high-degree file to degree 50 touches a tiny
+    fraction of its bytes. The unpacked matrices are cached in an .npz
+    beside the input so repeated renders skip the parse; the cache is
+    ignored when older than the BSHC file or truncated below the
+    requested degree.
+
+    Returns (cosine_coeffs, sine_coeffs, lmax) where the coefficient
+    arrays have shape (lmax+1, lmax+1) indexed [l, m] and lmax is the
+    effective (possibly truncated) degree.
+    """
+    cache_path = filepath + '.cache.npz'
+    if use_cache:
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(filepath):
+                cached = np.load(cache_path)
+                cached_lmax = int(cached['lmax'])
+                # The file's full degree is stored alongside so a cache
+                # written by a truncated load is never mistaken for the
+                # whole model when max_lmax is None. Old caches without
+                # the key fall through to a re-read via the KeyError.
+                file_lmax = int(cached['lmax_file'])
+                L = (file_lmax if max_lmax is None
+                     else min(max_lmax, file_lmax))
+                if cached_lmax >= L:
+                    return (cached['cos'][:L + 1, :L + 1],
+                            cached['sin'][:L + 1, :L + 1], L)
+        except (OSError, KeyError):
+            pass
+    # memmap instead of read() + frombuffer: the OS pages in only the
+    # slices actually touched and no whole-file bytes copy is held.
+    arr = np.memmap(filepath, dtype='<f8', mode='r')
+
+    lmin = int(arr[0])
+    lmax_file = int(arr[1])
+    lmax = lmax_file if max_lmax is None else min(max_lmax, lmax_file)
+    n_file = (lmax_file + 1) * (lmax_file + 2) // 2
+    n_coeffs = (lmax + 1) * (lmax + 2) // 2
+
+    cosine_flat = arr[2:2 + n_coeffs]
+    sine_flat = arr[2 + n_file:2 + n_file + n_coeffs]
+
+    cosine_coeffs = np.zeros((lmax + 1, lmax + 1))
+    sine_coeffs = np.zeros((lmax + 1, lmax + 1))
+
+    # The triangular packing is row-major in (l, m), so the (l, m) index
+    # of every flat entry follows from arithmetic and both arrays can be
+    # filled with one vectorized scatter each.
+    l_idx = np.repeat(np.arange(lmax + 1), np.arange(1, lmax + 2))
+    m_idx = np.arange(n_coeffs) - l_idx * (l_idx + 1) // 2
+    cosine_coeffs[l_idx, m_idx] = cosine_flat
+    sine_coeffs[l_idx, m_idx] = sine_flat
+
+    if use_cache:
+        try:
+            np.savez(cache_path, cos=cosine_coeffs, sin=sine_coeffs,
+                     lmax=lmax, lmax_file=lmax_file)
+        except OSError:
+            pass  # read-only input directory; just skip the cache
+
+    return cosine_coeffs, sine_coeffs, lmax
+
+
+def bar_plm_columns(x, m, lmax, sin_theta=None):
+    """
+    Orthonormal associated Legendre functions bar P_l^m(x) for one order
+    m and all degrees l = m..lmax, vectorized across x, with the
+    Condon-Shortley phase so bar P_l^m(cos theta) = Re(Y_l^m(theta, 0)).
+
+    Uses the standard stable three-term recurrence seeded from the
+    sectoral term; the seed's factorial prefactor and sin^m(theta) power
+    are combined in log space so large orders neither overflow the
+    double-factorial ratio nor underflow prematurely near the poles.
+    Pass sin_theta when it is known exactly — recovering it from
+    sqrt(1 - x^2) loses relative precision near the poles.
+    """
+    P = np.empty((lmax + 1 - m, x.size))
+    if sin_theta is None:
+        sin_theta = np.sqrt(np.maximum(0.0, 1.0 - x * x))
+
+    log_norm = 0.5 * (np.log(2 * m + 1.0) - np.log(4.0 * np.pi)
+                      + gammaln(2 * m + 1.0) - 2 * m * np.log(2.0)
+                      - 2 * gammaln(m + 1.0))
+    with np.errstate(divide='ignore'):
+        P[0] = (-1.0) ** m * np.exp(log_norm + m * np.log(sin_theta)) \
+            if m > 0 else np.full(x.size, np.exp(log_norm))
+
+    if lmax > m:
+        P[1] = np.sqrt(2.0 * m + 3.0) * x * P[0]
+    for l in range(m + 2, lmax + 1):
+        a = np.sqrt((4.0 * l * l - 1.0) / (l * l - m * m))
+        b = np.sqrt(((l - 1.0) ** 2 - m * m) / (4.0 * (l - 1.0) ** 2 - 1.0))
+        k = l - m
+        np.multiply(x, P[k - 1], out=P[k])
+        P[k] -= b * P[k - 2]
+        P[k] *= a
+    return P
+
+
+def trig_mphi_tables(phi, lmax):
+    """
+    cos(m*phi) and sin(m*phi) tables for m = 0..lmax.
+
+    Built with the Chebyshev recurrence cos((m+1)x) = 2cos(x)cos(mx) -
+    cos((m-1)x) (and its sine analogue): one cos/sin pair of
+    transcendental passes over phi total, then two multiply-adds per
+    order, all written in place into the tables. The tables inherit
+    phi's dtype, so a float32 phi yields float32 tables.
+    """
+    cm = np.empty((lmax + 1, phi.size), dtype=phi.dtype)
+    sm = np.empty((lmax + 1, phi.size), dtype=phi.dtype)
+    cm[0] = 1.0
+    sm[0] = 0.0
+    if lmax >= 1:
+        np.cos(phi, out=cm[1])
+        np.sin(phi, out=sm[1])
+        two_cos = 2.0 * cm[1]
+    for m in range(2, lmax + 1):
+        np.multiply(two_cos, cm[m - 1], out=cm[m])
+        cm[m] -= cm[m - 2]
+        np.multiply(two_cos, sm[m - 1], out=sm[m])
+        sm[m] -= sm[m - 2]
+    return cm, sm
+
+
+def synthesize_grid_separable(cosine_coeffs, sine_coeffs, max_lmax, lat, lon,
+                              dtype=np.float64):
+    """
+    Evaluate the expansion on a separable lat/lon grid without pyshtools.
+
+    Flattening the tensor-product grid recomputed cos(m*phi) for every
+    latitude row. Keeping the 2D structure, the trig tables are built
+    once per longitude column and the Legendre stack once per latitude
+    row; two matrix products then assemble the grid from the per-m
+    profiles.
+
+    Pass dtype=np.float32 to reconstruct the grid in single precision —
+    ample for an 8-bit colormapped render and half the memory traffic in
+    the FFT / matrix-product stage. The Legendre recurrence and profile
+    contraction always run in float64; only the per-m profiles are
+    downcast, so the small (lmax+1, n_lat) arrays are the only extras.
+    """
+    L = max_lmax
+    theta_1d = np.deg2rad(90.0 - lat)
+    phi_1d = np.deg2rad(lon) % (2 * np.pi)
+
+    cos_theta = np.cos(theta_1d)
+    sin_theta = np.sin(theta_1d)
+    if HAVE_CUPY and L >= GPU_MIN_LMAX:
+        A, B = _profiles_gpu(cosine_coeffs, sine_coeffs, L,
+                             cos_theta, sin_theta)
+    else:
+        A = np.zeros((L + 1, theta_1d.size))
+        B = np.zeros((L + 1, theta_1d.size))
+        sqrt2 = np.sqrt(2.0)
+        for m in range(L + 1):
+            P_m = bar_plm_columns(cos_theta, m, L, sin_theta=sin_theta)
+            w = 1.0 if m == 0 else sqrt2
+            A[m] = w * (cosine_coeffs[m:L + 1, m] @ P_m)
+            B[m] = w * (sine_coeffs[m:L + 1, m] @ P_m)
+
+    A = A.astype(dtype, copy=False)
+    B = B.astype(dtype, copy=False)
+
+    # On a uniform full-circle longitude grid the per-m reconstruction
+    # sum is exactly an inverse real FFT of the spectrum A_m - i*B_m:
+    # O(n_lon log n_lon) per latitude instead of O(L * n_lon).
+    n_lon = phi_1d.size
+    d_lon = np.diff(lon)
+    if (n_lon >= 2 * L + 2 and np.allclose(d_lon, d_lon[0])
+            and np.isclose(abs(d_lon[0]) * n_lon, 360.0)):
+        spectrum = np.zeros((n_lon // 2 + 1, theta_1d.size),
+                            dtype=np.result_type(dtype, np.complex64))
+        spectrum[:L + 1] = (A - 1j * B) * n_lon
+        spectrum[1:L + 1] *= 0.5
+        ring = np.fft.irfft(spectrum, n=n_lon, axis=0)
+        # irfft yields phi = 2*pi*k/n_lon; gather the requested origin
+        col = np.rint(phi_1d * (n_lon / (2 * np.pi))).astype(np.intp) % n_lon
+        return ring[col].T
+
+    cos_mphi, sin_mphi = trig_mphi_tables(phi_1d.astype(dtype, copy=False), L)
+    return A.T @ cos_mphi + B.T @ sin_mphi
+
+
+def synthesize_grid_sht(cosine_coeffs, sine_coeffs, max_lmax, resolution):
+    """
+    Synthesize the expansion on a Driscoll-Healy grid with pyshtools.
+
+    MakeGridDH runs the full SHT in O(L^3) — FFTs across longitude and
+    recurrence-based Legendre synthesis across latitude — instead of the
+    O(N_pix * L^2) pointwise evaluation. The DH grid is then rolled to a
+    [-180, 180) longitude origin and resampled to the requested output
+    resolution.
+    """
+    L = max_lmax
+    coeffs = np.zeros((2, L + 1, L + 1))
+    coeffs[0] = cosine_coeffs[:L + 1, :L + 1]
+    coeffs[1] = sine_coeffs[:L + 1, :L + 1]
+
+    grid = pysh.expand.MakeGridDH(coeffs, sampling=2, lmax=max_lmax)
+    # SHTOOLS needs float64 internally; downcast once before the
+    # roll/flip/zoom passes so they move half the bytes, and the
+    # colormap only needs 8 bits anyway
+    grid = grid.astype(np.float32)
+    # Recenter on the prime meridian with one column gather instead of
+    # np.roll's full-grid copy. The DH grid is already north-row-first,
+    # which is what both output paths (imshow with the default
+    # origin='upper', and the direct Pillow write) expect.
+    n_lon = grid.shape[1]
+    col_idx = (np.arange(n_lon) - n_lon // 2) % n_lon
+    grid = grid[:, col_idx]
+
+    target = (resolution, 2 * resolution)
+    if grid.shape != target:
+        grid = zoom(grid, (target[0] / grid.shape[0],
+                           target[1] / grid.shape[1]), order=1)
+    return grid
+
+
+def render_map_projection(cosine_coeffs, sine_coeffs, max_lmax, resolution,
+                          output_path, no_axes=False):
+    """Render the expansion on an equirectangular grid and save a PNG."""
+    if HAVE_PYSHTOOLS:
+        print(f'Synthesizing DH grid up to lmax={max_lmax}...')
+        grid = synthesize_grid_sht(cosine_coeffs, sine_coeffs,
+                                   max_lmax, resolution)
+    else:
+        lat = np.linspace(90.0, -90.0, resolution)
+        # endpoint=False keeps the longitude samples uniform over the
+        # full circle so the FFT reconstruction applies
+        lon = np.linspace(-180.0, 180.0, 2 * resolution, endpoint=False)
+
+        print(f'Evaluating {lat.size}x{lon.size} grid up to lmax={max_lmax}...')
+        # float32, matching the SHT path's post-synthesis downcast: the
+        # colormap only needs 8 bits anyway
+        grid = synthesize_grid_separable(cosine_coeffs, sine_coeffs,
+                                         max_lmax, lat, lon,
+                                         dtype=np.float32)
+
+    vmax = np.abs(grid).max()
+
+    if no_axes:
+        # Colormap the grid and hand the bytes straight to Pillow: no
+        # figure, fonts, Agg compositing or bbox tightening. zlib level
+        # 1 instead of the default 6 — these renders are throwaway
+        # inspection images, not archival assets.
+        norm = plt.Normalize(-vmax, vmax)
+        rgba = (plt.get_cmap('RdBu_r')(norm(grid)) * 255).astype(np.uint8)
+        Image.fromarray(rgba).save(output_path, optimize=False,
+                                   compress_level=1)
+        print(f'Saved {output_path}')
+        return
+
+    fig, ax = plt.subplots(figsize=(14, 7), dpi=150)
+    im = ax.imshow(grid, extent=[-180, 180, -90, 90],
+                   cmap='RdBu_r', vmin=-vmax, vmax=vmax)
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.set_title(f'Spherical harmonic expansion (lmax={max_lmax})')
+    fig.colorbar(im, ax=ax, shrink=0.7, label='Elevation (m)')
+    fig.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f'Saved {output_path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render a BSHC model to a map PNG')
+    parser.add_argument('input', help='Input .bshc file')
+    parser.add_argument('--max-lmax', type=int, default=50,
+                        help='Truncate the expansion at this degree')
+    parser.add_argument('--resolution', type=int, default=200,
+                        help='Number of latitude samples (longitude gets 2x)')
+    parser.add_argument('--output', default='bshc_render.png',
+                        help='Output PNG path')
+    parser.add_argument('--no-axes', action='store_true',
+                        help='Write the colormapped grid directly as a '
+                             'PNG, skipping matplotlib axes and labels')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the .npz coefficient '
+                             'cache beside the input file')
+    args = parser.parse_args()
+
+    cosine_coeffs, sine_coeffs, lmax = load_bshc(
+        args.input, max_lmax=args.max_lmax, use_cache=not args.no_cache)
+    print(f'Loaded {args.input}: lmax={lmax}')
+
+    max_lmax = min(args.max_lmax, lmax)
+    render_map_projection(cosine_coeffs, sine_coeffs, max_lmax,
+                          args.resolution, args.output,
+                          no_axes=args.no_axes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Render a BSHC spherical-harmonic model to a 2D map projection PNG using
+pyshtools' Driscoll–Healy grid expansion (FFT-based SHT). Orders of
+magnitude faster than the direct point evaluation in render_bshc.py for
+large lmax.
+"""
+
+import argparse
+import numpy as np
+import pyshtools as pysh
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+
+def render_map_projection(coeffs_array, max_lmax, output_path):
+    """Expand coefficients on a DH2 grid and save a PNG."""
+    grid = pysh.expand.MakeGridDH(coeffs_array, sampling=2, lmax=max_lmax)
+
+    n_lon = grid.shape[1]
+    # MakeGridDH starts at lon=0; recenter on the prime meridian and
+    # put north up for display. One gather instead of roll + flipud:
+    # the row flip stays a view and only the rolled axis materializes.
+    col_idx = (np.arange(n_lon) - n_lon // 2) % n_lon
+    grid = grid[::-1][:, col_idx]
+
+    vmax = np.abs(grid).max()
+    fig, ax = plt.subplots(figsize=(14, 7), dpi=150)
+    im = ax.imshow(grid, extent=[-180, 180, -90, 90], origin='lower',
+                   cmap='RdBu_r', vmin=-vmax, vmax=vmax)
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.set_title(f'Spherical harmonic expansion (lmax={max_lmax})')
+    fig.colorbar(im, ax=ax, shrink=0.7, label='Elevation (m)')
+    fig.savefig(output_path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    print(f'Saved {output_path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render a BSHC model to a map PNG (pyshtools SHT path)')
+    parser.add_argument('input', help='Input .bshc file')
+    parser.add_argument('--max-lmax', type=int, default=500,
+                        help='Truncate the expansion at this degree')
+    parser.add_argument('--output', default='bshc_render.png',
+                        help='Output PNG path')
+    args = parser.parse_args()
+
+    coeffs_array, lmax = pysh.shio.read_bshc(args.input)
+    print(f'Loaded {args.input}: lmax={lmax}')
+
+    max_lmax = min(args.max_lmax, lmax)
+    render_map_projection(coeffs_array, max_lmax, args.output)
+
+
+if __name__ == '__main__':
+    main()
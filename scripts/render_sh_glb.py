@@ -0,0 +1,882 @@
+#!/usr/bin/env python3
+"""
+Render a BSHC spherical-harmonic model as a 3D "balloon" mesh in GLB format.
+
+The mesh radius at each direction is r = |f(θ,φ)| with sign-based coloring
+(orange for positive, teal for negative), matching the SH Flow demo. Also
+supports an optional PNG preview of the shaded mesh.
+"""
+
+import argparse
+import json
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+POSITIVE_COLOR = np.array([1.0, 0.42, 0.21], dtype=np.float32)   # orange
+NEGATIVE_COLOR = np.array([0.31, 0.80, 0.77], dtype=np.float32)  # teal
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+try:
+    import moderngl
+    HAVE_MODERNGL = True
+except ImportError:
+    HAVE_MODERNGL = False
+
+if HAVE_NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _alp_table(x, A, B, seeds, max_lmax, P):
+        # Scalar three-term recurrence per vertex: fuses the O(lmax^2)
+        # vectorized passes of the NumPy path into one parallel loop
+        # nest with no temporaries. Fills the sin(theta)**-m scaled
+        # table, whose sectoral rows are the constant seeds.
+        for i in prange(x.shape[0]):
+            xi = x[i]
+            for m in range(max_lmax + 1):
+                P[m + m * (m + 1) // 2, i] = seeds[m]
+            for m in range(max_lmax):
+                j = m + m * (m + 1) // 2
+                k = m + (m + 1) * (m + 2) // 2
+                P[k, i] = A[k] * xi * P[j, i]
+                for l in range(m + 2, max_lmax + 1):
+                    j = m + l * (l + 1) // 2
+                    P[j, i] = A[j] * (xi * P[m + l * (l - 1) // 2, i]
+                                      + B[j] * P[m + (l - 1) * (l - 2) // 2, i])
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _clenshaw_eval(x, sin_theta, cos_phi, sin_phi, A, AB, seeds,
+                       cos_packed, sin_packed, top_l, max_lmax, out):
+        # Clenshaw summation per m-column: the sum over l collapses into
+        # a rolling two-term state seeded only by the sectoral value, so
+        # no (N, K) basis matrix is ever materialized. The azimuthal
+        # factors rotate in-register per vertex, so no trig tables are
+        # materialized either. top_l[m] caps each backward pass at the
+        # highest degree with a significant coefficient; columns with
+        # none are skipped outright.
+        for i in prange(x.shape[0]):
+            xi = x[i]
+            si = sin_theta[i]
+            cp = cos_phi[i]
+            sp = sin_phi[i]
+            total = np.float32(0.0)
+            sm = np.float32(1.0)
+            cos_m = np.float32(1.0)
+            sin_m = np.float32(0.0)
+            for m in range(max_lmax + 1):
+                if m > 0:
+                    sm *= si
+                    cos_m, sin_m = (cos_m * cp - sin_m * sp,
+                                    sin_m * cp + cos_m * sp)
+                top = top_l[m]
+                if top < m:
+                    continue
+                bc1 = np.float32(0.0)
+                bc2 = np.float32(0.0)
+                bs1 = np.float32(0.0)
+                bs2 = np.float32(0.0)
+                for l in range(top, m - 1, -1):
+                    k = m + l * (l + 1) // 2
+                    a1 = A[m + (l + 1) * (l + 2) // 2] * xi
+                    ab2 = AB[m + (l + 2) * (l + 3) // 2]
+                    bc = cos_packed[k] + a1 * bc1 + ab2 * bc2
+                    bs = sin_packed[k] + a1 * bs1 + ab2 * bs2
+                    bc2 = bc1
+                    bc1 = bc
+                    bs2 = bs1
+                    bs1 = bs
+                pmm = seeds[m] * sm
+                if m == 0:
+                    total += bc1 * pmm
+                else:
+                    total += pmm * (bc1 * cos_m + bs1 * sin_m)
+            out[i] = total
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _displace_and_color(vertices, sh_values, inv_vmax, pos, neg,
+                            displaced, colors):
+        # One fused sweep per vertex: radius normalization and floor,
+        # displacement, and sign color, with no full-size temporaries.
+        for i in prange(vertices.shape[0]):
+            v = sh_values[i]
+            r = abs(v) * inv_vmax
+            if r < 0.1:
+                r = 0.1
+            for k in range(3):
+                displaced[i, k] = vertices[i, k] * r
+                colors[i, k] = pos[k] if v >= 0.0 else neg[k]
+
+
+def create_icosahedron_subdivided(subdivisions):
+    """Create a unit icosphere by repeatedly subdividing an icosahedron."""
+    # Unit icosahedron vertices (1, golden ratio, 0)/sqrt(1 + phi^2),
+    # precomputed so the seed mesh is a bit-exact float32 constant.
+    a = np.float32(0.5257311)
+    b = np.float32(0.8506508)
+
+    vertices = np.array([
+        [-a, b, 0], [a, b, 0], [-a, -b, 0], [a, -b, 0],
+        [0, -a, b], [0, a, b], [0, -a, -b], [0, a, -b],
+        [b, 0, -a], [b, 0, a], [-b, 0, -a], [-b, 0, a],
+    ], dtype=np.float32)
+
+    faces = np.array([
+        [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1],
+    ], dtype=np.int64)
+
+    for _ in range(subdivisions):
+        vertices, faces = subdivide_mesh(vertices, faces)
+
+    return vertices, faces
+
+
+def subdivide_mesh(vertices, faces):
+    """
+    Subdivide each triangle into 4, projecting midpoints onto the sphere.
+
+    Fully vectorized: every unique edge is found in one np.unique pass
+    over sorted endpoint pairs, and all midpoints are created and
+    normalized as a single batch instead of per-face dict lookups.
+    """
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]],
+                            faces[:, [2, 0]]])
+    # Pack each canonicalized edge into one uint64 key so the dedupe is
+    # a plain 1-D np.unique instead of a lexicographic row sort.
+    lo = np.minimum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+    hi = np.maximum(edges[:, 0], edges[:, 1]).astype(np.uint64)
+    packed = (hi << np.uint64(32)) | lo
+    unique_packed, inverse = np.unique(packed, return_inverse=True)
+    edge_lo = (unique_packed & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    edge_hi = (unique_packed >> np.uint64(32)).astype(np.int64)
+
+    midpoints = (vertices[edge_lo] + vertices[edge_hi]) * 0.5
+    # Project onto the sphere with einsum + in-place sqrt/divide: no
+    # squared-element temporary or divided copy as with np.linalg.norm.
+    norms = np.einsum('ij,ij->i', midpoints, midpoints)
+    np.sqrt(norms, out=norms)
+    midpoints /= norms[:, None]
+
+    # Midpoint vertex index per original edge, in the same block order
+    # as `edges` (all v1-v2 edges, then v2-v3, then v3-v1).
+    n_faces = len(faces)
+    mid_idx = inverse + len(vertices)
+    a = mid_idx[:n_faces]
+    b = mid_idx[n_faces:2 * n_faces]
+    c = mid_idx[2 * n_faces:]
+    v1, v2, v3 = faces[:, 0], faces[:, 1], faces[:, 2]
+
+    new_faces = np.empty((n_faces, 4, 3), dtype=np.int64)
+    for corner, src in enumerate(((v1, a, c), (v2, b, a), (v3, c, b),
+                                  (a, b, c))):
+        for col in range(3):
+            new_faces[:, corner, col] = src[col]
+
+    return np.concatenate([vertices, midpoints]), new_faces.reshape(-1, 3)
+
+
+MESH_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                              'sphericalharmonics')
+
+
+def load_or_build_mesh(subdivisions):
+    """
+    Build the subdivided icosphere and its (theta, phi) angles, cached
+    on disk keyed by the subdivision level. The mesh is a deterministic
+    function of it, so repeated renders skip the geometry work entirely.
+    Each array lives in its own .npy file under the user cache dir, so
+    reloads memory-map straight from the page cache (np.load can only
+    mmap plain .npy files, not .npz archives).
+    """
+    names = ('vertices', 'faces', 'theta', 'phi')
+    prefix = os.path.join(MESH_CACHE_DIR, f'mesh_sub{subdivisions}_')
+    try:
+        return tuple(np.load(f'{prefix}{name}.npy', mmap_mode='r')
+                     for name in names)
+    except OSError:
+        pass
+
+    vertices, faces = create_icosahedron_subdivided(subdivisions)
+    theta, phi = cartesian_to_spherical(vertices)
+    arrays = (vertices, faces, theta, phi)
+    try:
+        os.makedirs(MESH_CACHE_DIR, exist_ok=True)
+        for name, array in zip(names, arrays):
+            np.save(f'{prefix}{name}.npy', array)
+    except OSError:
+        pass  # caching is best effort
+    return arrays
+
+
+def cartesian_to_spherical(vertices):
+    """Convert unit-sphere vertices to float32 (theta, phi) angles."""
+    # Contiguous per-component copies: the trig ufuncs then stream
+    # sequential float32 loads instead of strided column reads.
+    x = np.ascontiguousarray(vertices[:, 0], dtype=np.float32)
+    y = np.ascontiguousarray(vertices[:, 1], dtype=np.float32)
+    z = np.ascontiguousarray(vertices[:, 2], dtype=np.float32)
+
+    theta = np.arccos(z.clip(-1.0, 1.0))
+    phi = np.arctan2(y, x)
+    # Wrap [-pi, pi) to [0, 2*pi) by updating only the negative entries
+    # in place; np.where would compute phi + 2*pi everywhere and
+    # allocate a full replacement array.
+    negative = phi < 0
+    phi[negative] += np.float32(2 * np.pi)
+
+    return theta, phi
+
+
+def load_bshc(filepath):
+    """
+    Load a BSHC (binary spherical harmonic coefficients) file.
+
+    Returns (cosine_flat, sine_flat, lmax): flat triangular float32
+    arrays of length (lmax+1)(lmax+2)/2 indexed by m + l(l+1)/2, the
+    same layout as the file itself and the internal Legendre tables.
+    Keeping the triangle flat skips the half-empty (lmax+1)^2 square
+    arrays entirely; the coefficients are downcast to float32 at load
+    time since the whole evaluation pipeline is float32.
+    """
+    # Memory-map the doubles rather than reading the whole file into a
+    # bytes buffer first: the OS pages in only what the slices below
+    # touch, and the float32 casts are the only copies made.
+    arr = np.memmap(filepath, dtype='<f8', mode='r')
+
+    lmin = int(arr[0])
+    lmax = int(arr[1])
+    n_coeffs = (lmax + 1) * (lmax + 2) // 2
+
+    cosine_flat = arr[2:2 + n_coeffs].astype(np.float32)
+    sine_flat = arr[2 + n_coeffs:2 + 2 * n_coeffs].astype(np.float32)
+
+    return cosine_flat, sine_flat, lmax
+
+
+def _sectoral_seeds(max_lmax):
+    """
+    Per-m normalization seeds of the sectoral Legendre values, so that
+    P_bar(m, m) = seeds[m] * sin(theta)**m with Condon-Shortley phase.
+    Built by the Holmes-Featherstone diagonal recurrence
+    seed(m) = -sqrt((2m+1)/(2m)) * seed(m-1): the factorial ratio never
+    appears, so no gamma-function evaluations are needed.
+    """
+    seeds = np.empty(max_lmax + 1, dtype=np.float32)
+    value = 0.5 / np.sqrt(np.pi)
+    seeds[0] = value
+    for m in range(1, max_lmax + 1):
+        value *= -np.sqrt((2 * m + 1.0) / (2.0 * m))
+        seeds[m] = value
+    return seeds
+
+
+def _vertical_recurrence_coeffs(max_lmax):
+    """
+    A, B coefficient arrays of the vertical Legendre recurrence
+    P(l, m) = A*(x*P(l-1, m) + B*P(l-2, m)), flat-indexed by
+    PT(l, m) = m + l(l+1)/2. Diagonal entries, which the recurrence
+    never reads (sectoral values are seeded directly), are zeroed so
+    that products of these arrays stay finite.
+    """
+    num_entries = (max_lmax + 1) * (max_lmax + 2) // 2
+    ls = np.repeat(np.arange(max_lmax + 1), np.arange(1, max_lmax + 2))
+    ms = np.arange(num_entries) - ls * (ls + 1) // 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        A = np.sqrt((4.0 * ls * ls - 1.0)
+                    / (ls * ls - ms * ms)).astype(np.float32)
+        B = -np.sqrt(((ls - 1.0) ** 2 - ms * ms)
+                     / (4.0 * (ls - 1.0) ** 2 - 1.0)).astype(np.float32)
+    diagonal = ls == ms
+    A[diagonal] = 0.0
+    B[diagonal] = 0.0
+    return A, B
+
+
+_EVALUATION_TABLES = {}
+
+
+def _evaluation_tables(max_lmax):
+    """
+    Constant per-degree tables shared by the evaluation paths: the
+    vertical recurrence coefficients (built two degrees past max_lmax
+    so the Clenshaw backward pass can index its l+1 and l+2 rows — the
+    extra entries only ever multiply zero state), their elementwise
+    product, the sectoral seeds, and the sqrt(2) weights that fold the
+    real-basis factor into the m > 0 coefficients. These depend only on
+    max_lmax, never on the vertices, so they are cached by degree and
+    repeated evaluations skip the O(lmax^2) setup entirely.
+    """
+    tables = _EVALUATION_TABLES.get(max_lmax)
+    if tables is None:
+        A, B = _vertical_recurrence_coeffs(max_lmax + 2)
+        num_entries = (max_lmax + 1) * (max_lmax + 2) // 2
+        ls = np.repeat(np.arange(max_lmax + 1), np.arange(1, max_lmax + 2))
+        ms = np.arange(num_entries) - ls * (ls + 1) // 2
+        weight = np.where(ms > 0, np.sqrt(2.0), 1.0).astype(np.float32)
+        tables = (A, B, A * B, _sectoral_seeds(max_lmax), weight)
+        _EVALUATION_TABLES[max_lmax] = tables
+    return tables
+
+
+def build_sh_basis(theta, phi, max_lmax):
+    """
+    Build the real spherical harmonic basis matrix of shape (N, K) with
+    K = (max_lmax+1)^2, so an expansion evaluates as `basis @ coeffs`.
+
+    Uses the real-valued convention: for m > 0 the basis functions are
+    sqrt(2)*Re(Y_l^m) and sqrt(2)*Im(Y_l^m). The normalized associated
+    Legendre table is built once for all (l, m) by the standard three-term
+    recurrence, vectorized over the vertex axis. Columns are ordered per
+    degree l as [m=0, cos(phi), sin(phi), ..., cos(l*phi), sin(l*phi)],
+    matching pack_sh_coefficients.
+    """
+    num_entries = (max_lmax + 1) * (max_lmax + 2) // 2
+
+    def pt(l, m):
+        # Flat index of (l, m) in the lower-triangular Legendre table.
+        return m + l * (l + 1) // 2
+
+    x = np.cos(theta, dtype=np.float32)
+    sin_theta = np.sin(theta, dtype=np.float32)
+
+    A, B, _, seeds, _ = _evaluation_tables(max_lmax)
+
+    # P[pt(l, m)] holds the orthonormalized associated Legendre function
+    # scaled by sin(theta)**-m (sphericart-style), Condon-Shortley phase
+    # included. The scaling makes the sectoral rows constant and is
+    # undone by the Cartesian azimuthal factors below.
+    # The whole basis is float32: the GLB mesh is float32 anyway, and
+    # halving the table width doubles the effective BLAS bandwidth.
+    P = np.empty((num_entries, len(theta)), dtype=np.float32)
+
+    if HAVE_NUMBA:
+        _alp_table(x, A, B, seeds, max_lmax, P)
+    else:
+        for m in range(max_lmax + 1):
+            P[pt(m, m)] = seeds[m]
+
+        def fill_vertical(m):
+            P[pt(m + 1, m)] = A[pt(m + 1, m)] * x * P[pt(m, m)]
+            for l in range(m + 2, max_lmax + 1):
+                i = pt(l, m)
+                P[i] = A[i] * (x * P[pt(l - 1, m)]
+                               + B[i] * P[pt(l - 2, m)])
+
+        # Once the sectoral rows are seeded, each m-column recurrence is
+        # independent and writes disjoint table rows, and NumPy releases
+        # the GIL inside the arithmetic, so threads overlap the real
+        # work on the shared table.
+        if max_lmax > 0:
+            workers = min(max_lmax, os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # list() propagates any exception raised inside a worker
+                list(pool.map(fill_vertical, range(max_lmax)))
+
+    # Cartesian azimuthal recurrence: C/S carry sin(theta)**m times
+    # cos/sin(m*phi), built as powers of (x + i*y) on the unit sphere
+    # with two multiply-adds per m — no per-m trig and no sin-power
+    # chain for the sectoral values. The rotation chains across m, so
+    # run it up front; the column fills below then share nothing.
+    cx = sin_theta * np.cos(phi, dtype=np.float32)
+    cy = sin_theta * np.sin(phi, dtype=np.float32)
+    azimuthal = [(np.ones(len(theta), dtype=np.float32),
+                  np.zeros(len(theta), dtype=np.float32))]
+    for m in range(1, max_lmax + 1):
+        C, S = azimuthal[-1]
+        azimuthal.append((cx * C - cy * S, cx * S + cy * C))
+
+    basis = np.empty((len(theta), (max_lmax + 1) ** 2), dtype=np.float32)
+    sqrt2 = np.sqrt(2.0)
+
+    def fill_basis_columns(m):
+        C, S = azimuthal[m]
+        for l in range(m, max_lmax + 1):
+            col = l * l
+            if m == 0:
+                basis[:, col] = P[pt(l, 0)]
+            else:
+                scaled = sqrt2 * P[pt(l, m)]
+                basis[:, col + 2 * m - 1] = scaled * C
+                basis[:, col + 2 * m] = scaled * S
+
+    # Each m writes its own disjoint set of basis columns.
+    workers = min(max_lmax + 1, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill_basis_columns, range(max_lmax + 1)))
+
+    return basis
+
+
+def pack_sh_coefficients(cosine_flat, sine_flat, max_lmax):
+    """Pack the flat triangular coefficient arrays into basis column order."""
+    coeffs = np.empty((max_lmax + 1) ** 2, dtype=np.float32)
+    for l in range(max_lmax + 1):
+        col = l * l
+        base = l * (l + 1) // 2
+        coeffs[col] = cosine_flat[base]
+        coeffs[col + 1:col + 2 * l + 1:2] = cosine_flat[base + 1:base + l + 1]
+        coeffs[col + 2:col + 2 * l + 2:2] = sine_flat[base + 1:base + l + 1]
+    return coeffs
+
+
+def evaluate_sh_hardcoded(cosine_flat, sine_flat, theta, phi, max_lmax):
+    """
+    Closed-form evaluation for max_lmax <= 4: each basis function is a
+    short polynomial in the Cartesian coordinates, so no recurrence
+    tables are built at all. Signs match the recurrence path
+    (Condon-Shortley phase included). Coefficients are indexed by the
+    flat triangular index m + l(l+1)/2.
+    """
+    sin_theta = np.sin(theta, dtype=np.float32)
+    x = sin_theta * np.cos(phi, dtype=np.float32)
+    y = sin_theta * np.sin(phi, dtype=np.float32)
+    z = np.cos(theta, dtype=np.float32)
+    c = cosine_flat
+    s = sine_flat
+
+    values = np.full(len(theta), 0.28209479177387814 * c[0],
+                     dtype=np.float32)
+    if max_lmax >= 1:
+        values += 0.4886025119029199 * (c[1] * z - c[2] * x - s[2] * y)
+    if max_lmax >= 2:
+        values += 0.31539156525252005 * c[3] * (3.0 * z * z - 1.0)
+        values -= 1.0925484305920792 * z * (c[4] * x + s[4] * y)
+        values += 0.5462742152960396 * (c[5] * (x * x - y * y)
+                                        + 2.0 * s[5] * x * y)
+    if max_lmax >= 3:
+        values += 0.3731763325901154 * c[6] * (5.0 * z * z - 3.0) * z
+        values -= 0.4570457994644658 * ((5.0 * z * z - 1.0)
+                                        * (c[7] * x + s[7] * y))
+        values += 1.445305721320277 * z * (c[8] * (x * x - y * y)
+                                           + 2.0 * s[8] * x * y)
+        values -= 0.5900435899266435 * (c[9] * (x * x - 3.0 * y * y) * x
+                                        + s[9] * (3.0 * x * x - y * y) * y)
+    if max_lmax >= 4:
+        x2 = x * x
+        y2 = y * y
+        z2 = z * z
+        values += 0.10578554691520431 * c[10] * ((35.0 * z2 - 30.0) * z2
+                                                 + 3.0)
+        values -= 0.6690465435572892 * z * ((7.0 * z2 - 3.0)
+                                            * (c[11] * x + s[11] * y))
+        values += 0.47308734787878004 * ((7.0 * z2 - 1.0)
+                                         * (c[12] * (x2 - y2)
+                                            + 2.0 * s[12] * x * y))
+        values -= 1.7701307697799304 * z * (c[13] * (x2 - 3.0 * y2) * x
+                                            + s[13] * (3.0 * x2 - y2) * y)
+        values += 0.6258357354491761 * (c[14] * (x2 * x2 - 6.0 * x2 * y2
+                                                 + y2 * y2)
+                                        + 4.0 * s[14] * x * y * (x2 - y2))
+    return values
+
+
+def _evaluate_clenshaw(cosine_flat, sine_flat, theta, phi, max_lmax):
+    """
+    Evaluate the expansion by per-m Clenshaw summation under numba,
+    streaming over vertices without materializing the basis matrix.
+    """
+    x = np.cos(theta, dtype=np.float32)
+    sin_theta = np.sin(theta, dtype=np.float32)
+
+    A, _, AB, seeds, weight = _evaluation_tables(max_lmax)
+
+    # The coefficients already share the kernel's flat triangular layout;
+    # just fold in the sqrt(2) factor for m > 0. The m = 0 sine entries
+    # are multiplied by sin(0*phi) = 0 in the kernel, so they never
+    # contribute regardless of what the file stored there.
+    cos_packed = cosine_flat[:len(weight)] * weight
+    sin_packed = sine_flat[:len(weight)] * weight
+
+    # Highest significant degree per m-column, so the kernel's backward
+    # pass stops where the coefficients do and skips empty columns; a
+    # dense sweep would spin through every zero (l, m) pair per vertex.
+    ls = np.repeat(np.arange(max_lmax + 1), np.arange(1, max_lmax + 2))
+    ms = np.arange(len(weight)) - ls * (ls + 1) // 2
+    active = np.abs(cos_packed) + np.abs(sin_packed) > 1e-15
+    top_l = np.full(max_lmax + 1, -1, dtype=np.int64)
+    np.maximum.at(top_l, ms[active], ls[active])
+
+    cos_phi = np.cos(phi, dtype=np.float32)
+    sin_phi = np.sin(phi, dtype=np.float32)
+
+    values = np.empty(len(theta), dtype=np.float32)
+    _clenshaw_eval(x, sin_theta, cos_phi, sin_phi, A, AB, seeds,
+                   cos_packed, sin_packed, top_l, max_lmax, values)
+    return values
+
+
+def evaluate_real_spherical_harmonics(cosine_flat, sine_flat, theta, phi, max_lmax):
+    """
+    Evaluate the real spherical harmonic expansion at angles (theta, phi).
+    Coefficients are flat triangular arrays as returned by load_bshc.
+
+    With numba, each m-column is summed by Clenshaw's recurrence in one
+    streaming pass over the vertices. Otherwise the basis matrix is
+    built once and the accumulation over (l, m) becomes a single BLAS
+    matrix-vector product, which also lets callers reuse the basis
+    across coefficient sets.
+    """
+    # Truncated and sparse models leave whole degrees empty: clamp the
+    # expansion at the highest degree carrying a significant coefficient
+    # before building any tables for it. Degree l occupies the flat
+    # slice starting at l(l+1)/2, so reduceat over those row starts
+    # gives the per-degree maxima.
+    num_entries = (max_lmax + 1) * (max_lmax + 2) // 2
+    magnitude = (np.abs(cosine_flat[:num_entries])
+                 + np.abs(sine_flat[:num_entries]))
+    row_starts = np.arange(max_lmax + 1) * np.arange(max_lmax + 2)[1:] // 2
+    significant = np.nonzero(
+        np.maximum.reduceat(magnitude, row_starts) > 1e-15)[0]
+    if len(significant) == 0:
+        return np.zeros(len(theta), dtype=np.float32)
+    max_lmax = int(significant[-1])
+
+    if max_lmax <= 4:
+        return evaluate_sh_hardcoded(cosine_flat, sine_flat,
+                                     theta, phi, max_lmax)
+    if HAVE_NUMBA:
+        return _evaluate_clenshaw(cosine_flat, sine_flat,
+                                  theta, phi, max_lmax)
+    basis = build_sh_basis(theta, phi, max_lmax)
+    coeffs = pack_sh_coefficients(cosine_flat, sine_flat, max_lmax)
+    # Skip basis columns whose coefficient is negligible.
+    active = np.nonzero(np.abs(coeffs) > 1e-15)[0]
+    if active.size < coeffs.size:
+        return basis[:, active] @ coeffs[active]
+    return basis @ coeffs
+
+
+def create_glb_mesh(vertices, faces, colors, output_path):
+    """Write the mesh as a binary glTF (GLB) file with per-vertex colors."""
+    vertices_f32 = np.ascontiguousarray(vertices, dtype=np.float32)
+    # uint16 indices halve the index stream whenever they fit
+    # (subdivisions <= 5); larger meshes need uint32 to avoid
+    # truncation past 65535 vertices.
+    if len(vertices) > 0xFFFF:
+        index_dtype, index_component_type = np.uint32, 5125  # UNSIGNED_INT
+    else:
+        index_dtype, index_component_type = np.uint16, 5123  # UNSIGNED_SHORT
+    indices = np.ascontiguousarray(faces.ravel(), dtype=index_dtype)
+    colors_f32 = np.ascontiguousarray(colors, dtype=np.float32)
+
+    # Assemble the binary payload in one preallocated buffer: each array
+    # is copied straight into its slice as raw bytes, with no tobytes()
+    # temporaries and no quadratic bytes concatenation. The index block
+    # is padded so the color bufferView stays 4-byte aligned when the
+    # uint16 stream has an odd element count.
+    vertices_length = vertices_f32.nbytes
+    indices_length = indices.nbytes
+    index_padding = (4 - indices_length % 4) % 4
+    colors_offset = vertices_length + indices_length + index_padding
+    binary_data = bytearray(colors_offset + colors_f32.nbytes)
+    buffer_u8 = np.frombuffer(binary_data, dtype=np.uint8)
+    buffer_u8[:vertices_length] = vertices_f32.view(np.uint8).ravel()
+    buffer_u8[vertices_length:vertices_length + indices_length] = \
+        indices.view(np.uint8)
+    buffer_u8[colors_offset:] = colors_f32.view(np.uint8).ravel()
+
+    # The glTF document has a fixed shape, so build it as a plain dict
+    # and serialize it directly instead of going through a pygltflib
+    # object graph (which also drops that import from startup).
+    gltf = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0}],
+        'meshes': [{'primitives': [{
+            'attributes': {'POSITION': 0, 'COLOR_0': 2},
+            'indices': 1,
+            'mode': 4,  # TRIANGLES
+        }]}],
+        'accessors': [
+            {'bufferView': 0, 'componentType': 5126,  # FLOAT
+             'count': len(vertices), 'type': 'VEC3',
+             'min': vertices_f32.min(axis=0).tolist(),
+             'max': vertices_f32.max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': index_component_type,
+             'count': int(faces.size), 'type': 'SCALAR'},
+            {'bufferView': 2, 'componentType': 5126,
+             'count': len(colors), 'type': 'VEC3'},
+        ],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0,
+             'byteLength': vertices_length, 'target': 34962},
+            {'buffer': 0, 'byteOffset': vertices_length,
+             'byteLength': indices_length, 'target': 34963},
+            {'buffer': 0,
+             'byteOffset': colors_offset,
+             'byteLength': colors_f32.nbytes, 'target': 34962},
+        ],
+        'buffers': [{'byteLength': len(binary_data)}],
+    }
+
+    # GLB container: 12-byte header, then JSON and BIN chunks, each
+    # 4-byte aligned (spaces pad JSON, zeros pad BIN, per the spec).
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode('ascii')
+    json_chunk += b' ' * ((4 - len(json_chunk) % 4) % 4)
+    # The payload ends on the float32 color block, so its length is
+    # already 4-byte aligned and the BIN chunk needs no trailing pad.
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(binary_data)
+    with open(output_path, 'wb') as f:
+        f.write(struct.pack('<4sII', b'glTF', 2, total_length))
+        f.write(struct.pack('<I4s', len(json_chunk), b'JSON'))
+        f.write(json_chunk)
+        f.write(struct.pack('<I4s', len(binary_data), b'BIN\x00'))
+        f.write(binary_data)
+
+    print(f'Saved {output_path} ({len(vertices)} vertices, {len(faces)} faces)')
+
+
+def _view_rotation():
+    """Rotation matrix of the default 3/4 preview view (elev 30, azim -60)."""
+    azim = np.radians(-60.0)
+    elev = np.radians(30.0)
+    rot_z = np.array([[np.cos(azim), -np.sin(azim), 0.0],
+                      [np.sin(azim), np.cos(azim), 0.0],
+                      [0.0, 0.0, 1.0]])
+    rot_x = np.array([[1.0, 0.0, 0.0],
+                      [0.0, np.cos(elev), -np.sin(elev)],
+                      [0.0, np.sin(elev), np.cos(elev)]])
+    return (rot_x @ rot_z).astype(np.float32)
+
+
+def render_png_moderngl(vertices, faces, colors, output_path, size=800):
+    """
+    Rasterize a shaded preview PNG offscreen with moderngl: hardware
+    depth testing instead of matplotlib's Python-level triangle sort.
+    """
+    from PIL import Image
+
+    view = _view_rotation()
+    scale = 0.95 / np.abs(vertices).max()
+
+    ctx = moderngl.create_standalone_context()
+    prog = ctx.program(
+        vertex_shader='''
+            #version 330
+            uniform mat3 u_view;
+            uniform float u_scale;
+            in vec3 in_position;
+            in vec3 in_color;
+            out vec3 v_color;
+            void main() {
+                vec3 p = u_view * (in_position * u_scale);
+                gl_Position = vec4(p.x, p.z, -p.y, 1.0);
+                v_color = in_color;
+            }
+        ''',
+        fragment_shader='''
+            #version 330
+            in vec3 v_color;
+            out vec4 f_color;
+            void main() {
+                f_color = vec4(v_color, 1.0);
+            }
+        ''',
+    )
+    prog['u_view'].write(view.T.tobytes())  # column-major for GLSL
+    prog['u_scale'].value = float(scale)
+
+    attributes = np.hstack([vertices, colors]).astype('f4')
+    vbo = ctx.buffer(attributes.tobytes())
+    ibo = ctx.buffer(faces.astype(np.uint32).tobytes())
+    vao = ctx.vertex_array(prog, [(vbo, '3f 3f', 'in_position', 'in_color')],
+                           index_buffer=ibo)
+
+    fbo = ctx.framebuffer(
+        color_attachments=[ctx.renderbuffer((size, size))],
+        depth_attachment=ctx.depth_renderbuffer((size, size)))
+    fbo.use()
+    ctx.clear(1.0, 1.0, 1.0, 1.0)
+    ctx.enable(moderngl.DEPTH_TEST)
+    vao.render()
+
+    image = Image.frombytes('RGB', (size, size), fbo.read(components=3))
+    image.transpose(Image.FLIP_TOP_BOTTOM).save(output_path)
+    ctx.release()
+    print(f'Saved {output_path}')
+
+
+def render_png(vertices, faces, colors, output_path):
+    """Save a PNG preview with the fastest available renderer."""
+    if HAVE_MODERNGL:
+        render_png_moderngl(vertices, faces, colors, output_path)
+    else:
+        render_png_pillow(vertices, faces, colors, output_path)
+
+
+def render_png_pillow(vertices, faces, colors, output_path, size=800):
+    """
+    Rasterize a shaded preview PNG without a GPU: vectorized orthographic
+    projection plus back-to-front Pillow polygon fills. All per-triangle
+    math is batched in NumPy, so the only Python-level loop calls
+    Pillow's C polygon rasterizer once per visible face.
+    """
+    from PIL import Image, ImageDraw
+
+    view = _view_rotation()
+    scale = 0.95 / np.abs(vertices).max()
+    rotated = (vertices * scale) @ view.T
+
+    # Same screen mapping as the GL path: x right, rotated z up, and the
+    # viewer on the +y side. Pillow's y axis points down, hence the flip.
+    half = size / 2.0
+    screen_x = rotated[:, 0] * half + half
+    screen_y = half - rotated[:, 2] * half
+
+    # Back faces of a closed mesh are always overdrawn, so cull any face
+    # whose rotated normal points away from the viewer before sorting.
+    tri = rotated[faces]
+    normals_y = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])[:, 1]
+    visible = np.nonzero(normals_y > 0)[0]
+
+    # Painter's algorithm: sort the visible faces far to near by mean
+    # viewer distance and let later fills overwrite earlier ones.
+    order = visible[np.argsort(tri[visible, :, 1].mean(axis=1))]
+
+    points = np.empty((len(faces), 3, 2), dtype=np.float64)
+    points[:, :, 0] = screen_x[faces]
+    points[:, :, 1] = screen_y[faces]
+    flat_points = points.reshape(-1, 6).tolist()
+    fills = np.clip(colors[faces].mean(axis=1) * 255.0 + 0.5,
+                    0.0, 255.0).astype(np.uint8)
+    fills = list(map(tuple, fills.tolist()))
+
+    image = Image.new('RGB', (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for i in order:
+        draw.polygon(flat_points[i], fill=fills[i])
+    image.save(output_path)
+    print(f'Saved {output_path}')
+
+
+def shade_balloon(vertices, faces, sh_values):
+    """
+    Displace the unit icosphere by the normalized |f| radius and bake
+    sign-based colors with simple diffuse + ambient lighting. Returns
+    (displaced_vertices, vertex_colors).
+    """
+    # Balloon radius: r = |f| normalized, with a floor to avoid pinching
+    if HAVE_NUMBA:
+        displaced = np.empty_like(vertices)
+        colors = np.empty((len(vertices), 3), dtype=np.float32)
+        _displace_and_color(vertices, sh_values,
+                            1.0 / np.abs(sh_values).max(),
+                            POSITIVE_COLOR, NEGATIVE_COLOR,
+                            displaced, colors)
+    else:
+        radii = np.abs(sh_values)
+        radii *= 1.0 / radii.max()
+        np.maximum(radii, 0.1, out=radii)
+        displaced = vertices * radii[:, None]
+        # Broadcast-fill the positive color, then overwrite the negative
+        # rows with one boolean-mask assignment; np.where would build a
+        # mask-shaped temporary on top of the output.
+        colors = np.empty((len(vertices), 3), dtype=np.float32)
+        colors[:] = POSITIVE_COLOR
+        colors[sh_values < 0] = NEGATIVE_COLOR
+
+    # Face normals for lighting. One (F, 3, 3) gather serves both edge
+    # vectors: indexing corner columns separately would walk the faces
+    # array four times with strided reads. Normalize in place with
+    # einsum + reciprocal sqrt: no squared-sum temporary or divided
+    # copy as with np.linalg.norm(..., keepdims=True).
+    tri = displaced[faces]
+    face_normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    inv_norm = 1.0 / np.sqrt(np.einsum('ij,ij->i', face_normals,
+                                       face_normals))
+    face_normals *= inv_norm[:, None]
+
+    # Accumulate face normals onto vertices: bincount per component is
+    # a buffered C reduction, faster than the unbuffered np.add.at path.
+    flat_idx = faces.ravel()
+    repeated = np.repeat(face_normals, 3, axis=0)
+    vertex_normals = np.empty_like(displaced)
+    for k in range(3):
+        vertex_normals[:, k] = np.bincount(flat_idx, weights=repeated[:, k],
+                                           minlength=len(displaced))
+    inv_norm = 1.0 / np.sqrt(np.einsum('ij,ij->i', vertex_normals,
+                                       vertex_normals))
+    vertex_normals *= inv_norm[:, None]
+
+    # Simple diffuse + ambient lighting baked into vertex colors. The
+    # shading runs in place on the float32 color buffer: clip, scale and
+    # multiply all reuse their operands instead of allocating copies.
+    light_dir = (np.array([1.0, 1.0, 1.0]) / np.sqrt(3.0)).astype(np.float32)
+    lighting = vertex_normals @ light_dir
+    np.clip(lighting, 0.0, 1.0, out=lighting)
+    lighting *= np.float32(0.7)
+    lighting += np.float32(0.3)
+    colors *= lighting[:, None]
+    np.clip(colors, 0.0, 1.0, out=colors)
+
+    return displaced, colors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render a BSHC model as a 3D balloon mesh (GLB)')
+    parser.add_argument('input', nargs='+',
+                        help='Input .bshc file(s); several render as a batch')
+    parser.add_argument('--max-lmax', type=int, default=8,
+                        help='Truncate the expansion at this degree')
+    parser.add_argument('--subdivisions', type=int, default=4,
+                        help='Icosphere subdivision level')
+    parser.add_argument('--output', default='sh_balloon.glb',
+                        help='Output GLB path (per-input suffix in batch mode)')
+    parser.add_argument('--png', default=None,
+                        help='Also save a PNG preview to this path')
+    args = parser.parse_args()
+
+    models = []
+    for path in args.input:
+        cosine_flat, sine_flat, lmax = load_bshc(path)
+        print(f'Loaded {path}: lmax={lmax}')
+        models.append((cosine_flat, sine_flat, min(args.max_lmax, lmax)))
+
+    print(f'Building icosphere (subdivisions={args.subdivisions})...')
+    vertices, faces, theta, phi = load_or_build_mesh(args.subdivisions)
+
+    print(f'Evaluating spherical harmonics at {len(vertices)} vertices...')
+    if len(models) == 1:
+        cosine_flat, sine_flat, max_lmax = models[0]
+        all_values = [evaluate_real_spherical_harmonics(
+            cosine_flat, sine_flat, theta, phi, max_lmax)]
+    else:
+        # The basis matrix is shared by every sample, so one build plus
+        # a single GEMM evaluates the whole batch.
+        basis_lmax = max(max_lmax for _, _, max_lmax in models)
+        basis = build_sh_basis(theta, phi, basis_lmax)
+        coeff_matrix = np.zeros((len(models), (basis_lmax + 1) ** 2),
+                                dtype=np.float32)
+        for i, (cosine_flat, sine_flat, max_lmax) in enumerate(models):
+            coeff_matrix[i, :(max_lmax + 1) ** 2] = pack_sh_coefficients(
+                cosine_flat, sine_flat, max_lmax)
+        all_values = coeff_matrix @ basis.T
+
+    for path, sh_values in zip(args.input, all_values):
+        output, png = args.output, args.png
+        if len(models) > 1:
+            # Per-sample outputs: suffix with the input file stem.
+            stem = os.path.splitext(os.path.basename(path))[0]
+            root, ext = os.path.splitext(output)
+            output = f'{root}_{stem}{ext}'
+            if png:
+                root, ext = os.path.splitext(png)
+                png = f'{root}_{stem}{ext}'
+
+        displaced, colors = shade_balloon(vertices, faces, sh_values)
+        create_glb_mesh(displaced, faces, colors, output)
+        if png:
+            render_png(displaced, faces, colors, png)
+
+
+if __name__ == '__main__':
+    main()